@@ -0,0 +1,52 @@
+"""sync_state: resumable backfill checkpoint and progress
+
+Revision ID: 0b4e7a1d93c6
+Revises: f61a3c8e9b25
+Create Date: 2026-10-18 17:02:26.551384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b4e7a1d93c6'
+down_revision: Union[str, Sequence[str], None] = 'f61a3c8e9b25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("sync_state", sa.Column("backfill_status", sa.String(length=16), nullable=True))
+    op.add_column("sync_state", sa.Column("backfill_until", sa.BigInteger(), nullable=True))
+    op.add_column("sync_state", sa.Column("backfill_games", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("sync_state", sa.Column("backfill_total", sa.Integer(), nullable=True))
+    op.add_column("sync_state", sa.Column("backfill_error", sa.Text(), nullable=True))
+    op.add_column("sync_state", sa.Column("backfill_started_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("sync_state", sa.Column("backfill_finished_at", sa.DateTime(timezone=True), nullable=True))
+
+    # Users synced before this change went through a complete (if not resumable) backfill
+    op.execute(
+        """
+        UPDATE sync_state s SET
+            backfill_status = 'done',
+            backfill_games = (SELECT count(*) FROM user_games ug WHERE ug.user_id = s.user_id),
+            backfill_until = (
+                SELECT (extract(epoch FROM min(ug.played_at)) * 1000)::bigint
+                FROM user_games ug WHERE ug.user_id = s.user_id
+            )
+        WHERE s.last_game_at IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("sync_state", "backfill_finished_at")
+    op.drop_column("sync_state", "backfill_started_at")
+    op.drop_column("sync_state", "backfill_error")
+    op.drop_column("sync_state", "backfill_total")
+    op.drop_column("sync_state", "backfill_games")
+    op.drop_column("sync_state", "backfill_until")
+    op.drop_column("sync_state", "backfill_status")
@@ -0,0 +1,147 @@
+"""shared games: store each Lichess game once, link it to users via user_games
+
+Revision ID: 1c7f4e2a9b80
+Revises: e8a3b59d7f24
+Create Date: 2026-10-18 13:52:07.614203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c7f4e2a9b80'
+down_revision: Union[str, Sequence[str], None] = 'e8a3b59d7f24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_games",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("game_id", sa.Integer(), sa.ForeignKey("games.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("played_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("color", sa.String(length=5), nullable=True),
+        sa.UniqueConstraint("user_id", "game_id", name="uq_user_games_user_id_game_id"),
+    )
+
+    # The oldest row of every Lichess game becomes the shared one
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE game_keepers ON COMMIT DROP AS
+        SELECT id, min(id) OVER (PARTITION BY game_id) AS keeper_id FROM games
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO user_games (user_id, game_id, played_at, color)
+        SELECT g.user_id, k.keeper_id, g.played_at,
+               CASE
+                   WHEN lower(g.white) = lower(u.username) THEN 'white'
+                   WHEN lower(g.black) = lower(u.username) THEN 'black'
+               END
+        FROM games g
+        JOIN game_keepers k ON k.id = g.id
+        JOIN users u ON u.id = g.user_id
+        ORDER BY g.id
+        ON CONFLICT ON CONSTRAINT uq_user_games_user_id_game_id DO NOTHING
+        """
+    )
+    # Keep a PGN if only a duplicate had one
+    op.execute(
+        """
+        INSERT INTO game_pgn (game_id, data, raw_size)
+        SELECT DISTINCT ON (k.keeper_id) k.keeper_id, p.data, p.raw_size
+        FROM game_pgn p
+        JOIN game_keepers k ON k.id = p.game_id
+        WHERE k.id <> k.keeper_id
+        ORDER BY k.keeper_id, k.id
+        ON CONFLICT (game_id) DO NOTHING
+        """
+    )
+    op.execute("DELETE FROM games g USING game_keepers k WHERE k.id = g.id AND k.id <> k.keeper_id")
+
+    op.drop_index("ix_games_user_id_opening_trgm", table_name="games")
+    op.drop_index("ix_games_user_id_played_at_id", table_name="games")
+    op.drop_constraint("uq_games_user_id_game_id", "games", type_="unique")
+    op.drop_index("ix_games_user_id", table_name="games")
+    op.drop_column("games", "user_id")
+    op.drop_index("ix_games_game_id", table_name="games")
+    op.create_index("ix_games_game_id", "games", ["game_id"], unique=True)
+
+    op.create_index("ix_user_games_game_id", "user_games", ["game_id"])
+    op.create_index(
+        "ix_user_games_user_id_played_at_id",
+        "user_games",
+        ["user_id", sa.text("played_at DESC"), sa.text("id DESC")],
+    )
+    op.create_index(
+        "ix_games_opening_trgm",
+        "games",
+        ["opening"],
+        postgresql_using="gin",
+        postgresql_ops={"opening": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_games_opening_trgm", table_name="games")
+    op.drop_index("ix_games_game_id", table_name="games")
+    op.create_index("ix_games_game_id", "games", ["game_id"])
+    op.add_column(
+        "games",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=True),
+    )
+
+    # The first linked user keeps the existing row, every other user gets a copy
+    op.execute(
+        """
+        UPDATE games g SET user_id = ug.user_id
+        FROM (SELECT DISTINCT ON (game_id) game_id, user_id FROM user_games ORDER BY game_id, id) ug
+        WHERE ug.game_id = g.id
+        """
+    )
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE game_copies ON COMMIT DROP AS
+        SELECT ug.game_id AS source_id, ug.user_id, nextval(pg_get_serial_sequence('games', 'id')) AS id
+        FROM user_games ug
+        JOIN games g ON g.id = ug.game_id
+        WHERE g.user_id <> ug.user_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO games (id, user_id, game_id, white, black, result, opening, time_class, played_at)
+        SELECT c.id, c.user_id, g.game_id, g.white, g.black, g.result, g.opening, g.time_class, g.played_at
+        FROM game_copies c JOIN games g ON g.id = c.source_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO game_pgn (game_id, data, raw_size)
+        SELECT c.id, p.data, p.raw_size FROM game_copies c JOIN game_pgn p ON p.game_id = c.source_id
+        """
+    )
+    op.execute("DELETE FROM games WHERE user_id IS NULL")
+    op.alter_column("games", "user_id", nullable=False)
+
+    op.create_index("ix_games_user_id", "games", ["user_id"])
+    op.create_unique_constraint("uq_games_user_id_game_id", "games", ["user_id", "game_id"])
+    op.create_index(
+        "ix_games_user_id_played_at_id",
+        "games",
+        ["user_id", sa.text("played_at DESC"), sa.text("id DESC")],
+    )
+    op.create_index(
+        "ix_games_user_id_opening_trgm",
+        "games",
+        ["user_id", "opening"],
+        postgresql_using="gin",
+        postgresql_ops={"opening": "gin_trgm_ops"},
+    )
+    op.drop_table("user_games")
@@ -0,0 +1,26 @@
+"""user_games: drop links to games the user didn't play
+
+Revision ID: 2a9d6c0e5f38
+Revises: 8f5e1b3a7d92
+Create Date: 2026-10-18 19:02:51.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2a9d6c0e5f38'
+down_revision: Union[str, Sequence[str], None] = '8f5e1b3a7d92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Archive imports used to link every game of the archive; these were never counted in the stats
+    op.execute("DELETE FROM user_games WHERE color IS NULL")
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,44 @@
+"""sync_state: per-user incremental sync watermark
+
+Revision ID: 3f8d2c61a9e0
+Revises: 9c3e1a7b2d54
+Create Date: 2026-10-18 10:03:11.524870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8d2c61a9e0'
+down_revision: Union[str, Sequence[str], None] = '9c3e1a7b2d54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_state",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("last_game_at", sa.BigInteger(), nullable=True),
+        sa.Column("last_game_id", sa.String(length=64), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+    # Seed watermarks from the newest game already stored for each user
+    op.execute(
+        """
+        INSERT INTO sync_state (user_id, last_game_at, last_game_id)
+        SELECT DISTINCT ON (user_id)
+            user_id, (extract(epoch FROM played_at) * 1000)::bigint, game_id
+        FROM games
+        WHERE played_at IS NOT NULL
+        ORDER BY user_id, played_at DESC
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sync_state")
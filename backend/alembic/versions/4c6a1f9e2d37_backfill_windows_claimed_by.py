@@ -0,0 +1,26 @@
+"""backfill_windows: claiming task id
+
+Revision ID: 4c6a1f9e2d37
+Revises: 7b1e4d8a2c65
+Create Date: 2026-10-18 21:14:37.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c6a1f9e2d37'
+down_revision: Union[str, Sequence[str], None] = '7b1e4d8a2c65'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("backfill_windows", sa.Column("claimed_by", sa.String(length=155), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("backfill_windows", "claimed_by")
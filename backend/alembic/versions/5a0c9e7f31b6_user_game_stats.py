@@ -0,0 +1,53 @@
+"""user_game_stats: per-user counters by time_class, color and outcome
+
+Revision ID: 5a0c9e7f31b6
+Revises: b71e04d5c2a8
+Create Date: 2026-10-18 11:27:05.661943
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a0c9e7f31b6'
+down_revision: Union[str, Sequence[str], None] = 'b71e04d5c2a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_game_stats",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("time_class", sa.String(length=32), primary_key=True),
+        sa.Column("color", sa.String(length=5), primary_key=True),
+        sa.Column("outcome", sa.String(length=4), primary_key=True),
+        sa.Column("games", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    # Initial fill for existing users (same as `python -m app.cli rebuild-stats`)
+    op.execute(
+        """
+        INSERT INTO user_game_stats (user_id, time_class, color, outcome, games)
+        SELECT user_id, time_class, color,
+               CASE WHEN result = '1/2-1/2' THEN 'draw'
+                    WHEN (result = '1-0') = (color = 'white') THEN 'win'
+                    ELSE 'loss' END AS outcome,
+               count(*)
+        FROM (
+            SELECT g.user_id, g.time_class, g.result,
+                   CASE WHEN lower(g.white) = lower(u.username) THEN 'white'
+                        WHEN lower(g.black) = lower(u.username) THEN 'black' END AS color
+            FROM games g JOIN users u ON u.id = g.user_id
+        ) AS per_game
+        WHERE color IS NOT NULL
+        GROUP BY user_id, time_class, color, outcome
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_game_stats")
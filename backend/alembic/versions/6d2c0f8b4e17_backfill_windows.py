@@ -0,0 +1,58 @@
+"""backfill_windows: parallel time-sliced history backfill
+
+Revision ID: 6d2c0f8b4e17
+Revises: 0b4e7a1d93c6
+Create Date: 2026-10-18 17:44:10.372915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6d2c0f8b4e17'
+down_revision: Union[str, Sequence[str], None] = '0b4e7a1d93c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "backfill_windows",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("since", sa.BigInteger(), nullable=False),
+        sa.Column("until", sa.BigInteger(), nullable=False),
+        sa.Column("checkpoint", sa.BigInteger(), nullable=True),
+        sa.Column("games", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="pending"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_backfill_windows_user_id", "backfill_windows", ["user_id"])
+
+    # An unfinished single-stream backfill becomes one window covering what is left
+    op.execute(
+        """
+        INSERT INTO backfill_windows (user_id, since, until, checkpoint, games, status, updated_at)
+        SELECT user_id, 0, backfill_until, backfill_until, backfill_games, 'pending', now()
+        FROM sync_state
+        WHERE backfill_status IN ('running', 'failed') AND backfill_until IS NOT NULL
+        """
+    )
+    op.drop_column("sync_state", "backfill_until")
+
+
+def downgrade() -> None:
+    op.add_column("sync_state", sa.Column("backfill_until", sa.BigInteger(), nullable=True))
+    op.execute(
+        """
+        UPDATE sync_state s SET backfill_until = w.checkpoint
+        FROM (SELECT user_id, min(checkpoint) AS checkpoint FROM backfill_windows GROUP BY user_id) w
+        WHERE w.user_id = s.user_id
+        """
+    )
+    op.drop_index("ix_backfill_windows_user_id", table_name="backfill_windows")
+    op.drop_table("backfill_windows")
@@ -0,0 +1,36 @@
+"""user_games: keyset index with undated games last
+
+Revision ID: 7b1e4d8a2c65
+Revises: d3b7a5e19c04
+Create Date: 2026-10-18 19:58:12.904377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e4d8a2c65'
+down_revision: Union[str, Sequence[str], None] = 'd3b7a5e19c04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index("ix_user_games_user_id_played_at_id", table_name="user_games")
+    op.create_index(
+        "ix_user_games_user_id_played_at_id",
+        "user_games",
+        ["user_id", sa.text("played_at DESC NULLS LAST"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_games_user_id_played_at_id", table_name="user_games")
+    op.create_index(
+        "ix_user_games_user_id_played_at_id",
+        "user_games",
+        ["user_id", sa.text("played_at DESC"), sa.text("id DESC")],
+    )
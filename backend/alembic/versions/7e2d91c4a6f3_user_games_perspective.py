@@ -0,0 +1,102 @@
+"""user_games: the user's side of each game (color, outcome, opponent, ratings)
+
+Revision ID: 7e2d91c4a6f3
+Revises: 1c7f4e2a9b80
+Create Date: 2026-10-18 14:20:33.905128
+
+"""
+import logging
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import decompress_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2d91c4a6f3'
+down_revision: Union[str, Sequence[str], None] = '1c7f4e2a9b80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+BATCH_SIZE = 5000
+
+_PGN_TAG = re.compile(r'^\[(WhiteElo|BlackElo|Event) "([^"]*)"\]', re.MULTILINE)
+
+
+def upgrade() -> None:
+    op.add_column("user_games", sa.Column("time_class", sa.String(length=32), nullable=True))
+    op.add_column("user_games", sa.Column("outcome", sa.String(length=4), nullable=True))
+    op.add_column("user_games", sa.Column("opponent", sa.String(length=64), nullable=True))
+    op.add_column("user_games", sa.Column("my_rating", sa.Integer(), nullable=True))
+    op.add_column("user_games", sa.Column("opponent_rating", sa.Integer(), nullable=True))
+    op.add_column("user_games", sa.Column("rated", sa.Boolean(), nullable=True))
+
+    op.execute(
+        """
+        UPDATE user_games ug SET
+            time_class = g.time_class,
+            outcome = CASE
+                WHEN g.result = '1/2-1/2' THEN 'draw'
+                WHEN (g.result = '1-0') = (ug.color = 'white') THEN 'win'
+                ELSE 'loss'
+            END,
+            opponent = CASE ug.color WHEN 'white' THEN g.black ELSE g.white END
+        FROM games g
+        WHERE g.id = ug.game_id AND ug.color IS NOT NULL
+        """
+    )
+    op.execute("UPDATE user_games ug SET time_class = g.time_class FROM games g WHERE g.id = ug.game_id AND ug.color IS NULL")
+
+    # Ratings and the rated flag were never stored as columns: recover them from the PGN tags
+    conn = op.get_bind()
+    select_batch = sa.text(
+        "SELECT ug.id, ug.color, p.data FROM user_games ug JOIN game_pgn p ON p.game_id = ug.game_id "
+        "WHERE ug.id > :last_id AND ug.color IS NOT NULL ORDER BY ug.id LIMIT :limit"
+    )
+    update_link = sa.text(
+        "UPDATE user_games SET my_rating = :my_rating, opponent_rating = :opponent_rating, rated = :rated "
+        "WHERE id = :id"
+    )
+
+    last_id = 0
+    updated = 0
+    while True:
+        rows = conn.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        params = []
+        for link_id, color, data in rows:
+            tags = dict(_PGN_TAG.findall(decompress_text(bytes(data))))
+            ratings = {"white": tags.get("WhiteElo"), "black": tags.get("BlackElo")}
+            opponent_color = "black" if color == "white" else "white"
+            params.append({
+                "id": link_id,
+                "my_rating": int(ratings[color]) if (ratings[color] or "").isdigit() else None,
+                "opponent_rating": int(ratings[opponent_color]) if (ratings[opponent_color] or "").isdigit() else None,
+                "rated": tags["Event"].startswith("Rated") if "Event" in tags else None,
+            })
+        conn.execute(update_link, params)
+        updated += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"user_games: recovered ratings for {updated} games")
+
+    op.create_index(
+        "ix_user_games_user_id_outcome_time_class_played_at",
+        "user_games",
+        ["user_id", "outcome", "time_class", "played_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_games_user_id_outcome_time_class_played_at", table_name="user_games")
+    op.drop_column("user_games", "rated")
+    op.drop_column("user_games", "opponent_rating")
+    op.drop_column("user_games", "my_rating")
+    op.drop_column("user_games", "opponent")
+    op.drop_column("user_games", "outcome")
+    op.drop_column("user_games", "time_class")
@@ -0,0 +1,31 @@
+"""sync_state: adaptive per-user sync schedule
+
+Revision ID: 8f5e1b3a7d92
+Revises: 6d2c0f8b4e17
+Create Date: 2026-10-18 18:21:37.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f5e1b3a7d92'
+down_revision: Union[str, Sequence[str], None] = '6d2c0f8b4e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL next_sync_at means due now: every existing user is synced on the next run
+    op.add_column("sync_state", sa.Column("next_sync_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("sync_state", sa.Column("sync_interval", sa.Integer(), nullable=True))
+    op.create_index("ix_sync_state_next_sync_at", "sync_state", ["next_sync_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sync_state_next_sync_at", table_name="sync_state")
+    op.drop_column("sync_state", "sync_interval")
+    op.drop_column("sync_state", "next_sync_at")
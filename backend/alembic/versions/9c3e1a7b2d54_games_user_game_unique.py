@@ -0,0 +1,36 @@
+"""games: unique (user_id, game_id) for bulk upsert
+
+Revision ID: 9c3e1a7b2d54
+Revises: 40eef8cfaadf
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3e1a7b2d54'
+down_revision: Union[str, Sequence[str], None] = '40eef8cfaadf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Drop duplicates that the per-row SELECT could have let through, keeping the oldest row
+    op.execute(
+        """
+        DELETE FROM games a
+        USING games b
+        WHERE a.user_id = b.user_id AND a.game_id = b.game_id AND a.id > b.id
+        """
+    )
+    op.drop_constraint("games_game_id_key", "games", type_="unique")
+    op.create_unique_constraint("uq_games_user_id_game_id", "games", ["user_id", "game_id"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_games_user_id_game_id", "games", type_="unique")
+    op.create_unique_constraint("games_game_id_key", "games", ["game_id"])
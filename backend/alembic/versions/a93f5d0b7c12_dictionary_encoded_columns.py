@@ -0,0 +1,114 @@
+"""dictionary-encode games: openings lookup table, SMALLINT time class / result / outcome
+
+Revision ID: a93f5d0b7c12
+Revises: 7e2d91c4a6f3
+Create Date: 2026-10-18 14:58:12.417730
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import OUTCOMES, RESULTS, TIME_CLASSES, decompress_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93f5d0b7c12'
+down_revision: Union[str, Sequence[str], None] = '7e2d91c4a6f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_ECO_TAG = re.compile(r'^\[ECO "([A-E]\d\d)"\]', re.MULTILINE)
+
+# (table, column, code table, VARCHAR length to restore on downgrade)
+CODED_COLUMNS = [
+    ("games", "result", RESULTS, 16),
+    ("games", "time_class", TIME_CLASSES, 32),
+    ("user_games", "time_class", TIME_CLASSES, 32),
+    ("user_games", "outcome", OUTCOMES, 4),
+    ("user_game_stats", "time_class", TIME_CLASSES, 32),
+    ("user_game_stats", "outcome", OUTCOMES, 4),
+]
+
+
+def _to_code(column: str, values) -> str:
+    whens = " ".join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values) if code)
+    return f"CASE {column} {whens} ELSE 0 END"
+
+
+def _from_code(column: str, values) -> str:
+    whens = " ".join(f"WHEN {code} THEN '{value}'" for code, value in enumerate(values))
+    return f"CASE {column} {whens} END"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "openings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=255), nullable=False, unique=True),
+        sa.Column("eco", sa.String(length=3), nullable=True),
+    )
+    op.execute("INSERT INTO openings (name) SELECT DISTINCT opening FROM games WHERE opening IS NOT NULL ORDER BY 1")
+
+    op.add_column("games", sa.Column("opening_id", sa.Integer(), sa.ForeignKey("openings.id"), nullable=True))
+    op.execute("UPDATE games g SET opening_id = o.id FROM openings o WHERE o.name = g.opening")
+
+    # ECO codes were never stored: take them from one PGN per opening
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT DISTINCT ON (g.opening_id) g.opening_id, p.data FROM games g "
+        "JOIN game_pgn p ON p.game_id = g.id WHERE g.opening_id IS NOT NULL "
+        "ORDER BY g.opening_id, g.id"
+    )).all()
+    params = []
+    for opening_id, data in rows:
+        match = _ECO_TAG.search(decompress_text(bytes(data)))
+        if match:
+            params.append({"id": opening_id, "eco": match.group(1)})
+    if params:
+        conn.execute(sa.text("UPDATE openings SET eco = :eco WHERE id = :id"), params)
+
+    op.drop_index("ix_games_opening_trgm", table_name="games")
+    op.drop_column("games", "opening")
+    op.create_index("ix_games_opening_id", "games", ["opening_id"])
+    op.create_index(
+        "ix_openings_name_trgm",
+        "openings",
+        ["name"],
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+
+    for table, column, values, _ in CODED_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.SmallInteger(),
+            postgresql_using=_to_code(column, values),
+        )
+
+
+def downgrade() -> None:
+    for table, column, values, length in CODED_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.String(length=length),
+            postgresql_using=_from_code(column, values),
+        )
+
+    op.add_column("games", sa.Column("opening", sa.String(length=255), nullable=True))
+    op.execute("UPDATE games g SET opening = o.name FROM openings o WHERE o.id = g.opening_id")
+    op.drop_index("ix_openings_name_trgm", table_name="openings")
+    op.drop_index("ix_games_opening_id", table_name="games")
+    op.drop_column("games", "opening_id")
+    op.create_index(
+        "ix_games_opening_trgm",
+        "games",
+        ["opening"],
+        postgresql_using="gin",
+        postgresql_ops={"opening": "gin_trgm_ops"},
+    )
+    op.drop_table("openings")
@@ -0,0 +1,30 @@
+"""games: (user_id, played_at DESC, id DESC) index for keyset pagination
+
+Revision ID: b71e04d5c2a8
+Revises: 3f8d2c61a9e0
+Create Date: 2026-10-18 10:41:52.307716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71e04d5c2a8'
+down_revision: Union[str, Sequence[str], None] = '3f8d2c61a9e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_games_user_id_played_at_id",
+        "games",
+        ["user_id", sa.text("played_at DESC"), sa.text("id DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_games_user_id_played_at_id", table_name="games")
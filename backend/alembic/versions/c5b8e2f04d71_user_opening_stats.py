@@ -0,0 +1,61 @@
+"""user_opening_stats: monthly per-opening rollup
+
+Revision ID: c5b8e2f04d71
+Revises: a93f5d0b7c12
+Create Date: 2026-10-18 15:37:45.288164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5b8e2f04d71'
+down_revision: Union[str, Sequence[str], None] = 'a93f5d0b7c12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_opening_stats",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("opening_id", sa.Integer(), sa.ForeignKey("openings.id"), primary_key=True),
+        sa.Column("color", sa.String(length=5), primary_key=True),
+        sa.Column("time_class", sa.SmallInteger(), primary_key=True),
+        sa.Column("month", sa.Date(), primary_key=True),
+        sa.Column("games", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("wins", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("draws", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("losses", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("opponent_rating_sum", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("rated_opponents", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    # outcome codes: see app.models.types.OUTCOMES
+    op.execute(
+        """
+        INSERT INTO user_opening_stats (
+            user_id, opening_id, color, time_class, month,
+            games, wins, draws, losses, opponent_rating_sum, rated_opponents
+        )
+        SELECT ug.user_id, g.opening_id, ug.color, ug.time_class,
+               date_trunc('month', ug.played_at AT TIME ZONE 'UTC')::date,
+               count(*),
+               count(*) FILTER (WHERE ug.outcome = 1),
+               count(*) FILTER (WHERE ug.outcome = 3),
+               count(*) FILTER (WHERE ug.outcome = 2),
+               coalesce(sum(ug.opponent_rating), 0),
+               count(ug.opponent_rating)
+        FROM user_games ug
+        JOIN games g ON g.id = ug.game_id
+        WHERE ug.color IS NOT NULL AND ug.played_at IS NOT NULL AND g.opening_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4, 5
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_opening_stats")
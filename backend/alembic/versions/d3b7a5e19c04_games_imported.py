@@ -0,0 +1,29 @@
+"""games.imported: mark games that came from uploaded archives
+
+Revision ID: d3b7a5e19c04
+Revises: 2a9d6c0e5f38
+Create Date: 2026-10-18 19:24:08.530176
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3b7a5e19c04'
+down_revision: Union[str, Sequence[str], None] = '2a9d6c0e5f38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("games", sa.Column("imported", sa.Boolean(), nullable=False, server_default=sa.false()))
+    # Games with our own ids can only come from archives; imported copies of
+    # Lichess games can't be told apart from fetched ones anymore.
+    op.execute("UPDATE games SET imported = true WHERE game_id LIKE 'pgn-%'")
+
+
+def downgrade() -> None:
+    op.drop_column("games", "imported")
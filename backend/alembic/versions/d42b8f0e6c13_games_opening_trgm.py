@@ -0,0 +1,35 @@
+"""games: trigram GIN index on (user_id, opening)
+
+Revision ID: d42b8f0e6c13
+Revises: 5a0c9e7f31b6
+Create Date: 2026-10-18 12:02:37.940152
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd42b8f0e6c13'
+down_revision: Union[str, Sequence[str], None] = '5a0c9e7f31b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # btree_gin lets the integer user_id share the GIN index with the trigrams
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.create_index(
+        "ix_games_user_id_opening_trgm",
+        "games",
+        ["user_id", "opening"],
+        postgresql_using="gin",
+        postgresql_ops={"opening": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_games_user_id_opening_trgm", table_name="games")
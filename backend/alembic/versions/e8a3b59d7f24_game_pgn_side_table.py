@@ -0,0 +1,89 @@
+"""game_pgn: move PGNs out of games into a compressed side table
+
+Revision ID: e8a3b59d7f24
+Revises: d42b8f0e6c13
+Create Date: 2026-10-18 13:15:48.270391
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import compress_text, decompress_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a3b59d7f24'
+down_revision: Union[str, Sequence[str], None] = 'd42b8f0e6c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    op.create_table(
+        "game_pgn",
+        sa.Column("game_id", sa.Integer(), sa.ForeignKey("games.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("raw_size", sa.Integer(), nullable=False),
+    )
+
+    conn = op.get_bind()
+    select_batch = sa.text(
+        "SELECT id, pgn FROM games WHERE id > :last_id AND pgn IS NOT NULL AND pgn <> '' "
+        "ORDER BY id LIMIT :limit"
+    )
+    insert_pgn = sa.text("INSERT INTO game_pgn (game_id, data, raw_size) VALUES (:game_id, :data, :raw_size)")
+
+    last_id = 0
+    raw_bytes = stored_bytes = converted = 0
+    while True:
+        rows = conn.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        params = []
+        for game_id, pgn in rows:
+            data = compress_text(pgn)
+            raw_size = len(pgn.encode())
+            params.append({"game_id": game_id, "data": data, "raw_size": raw_size})
+            raw_bytes += raw_size
+            stored_bytes += len(data)
+        conn.execute(insert_pgn, params)
+        converted += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"game_pgn: converted {converted} PGNs")
+
+    logger.info(
+        f"game_pgn: {converted} PGNs, {raw_bytes} bytes raw -> {stored_bytes} bytes compressed "
+        f"({raw_bytes - stored_bytes} bytes saved)"
+    )
+
+    op.drop_column("games", "pgn")
+
+
+def downgrade() -> None:
+    op.add_column("games", sa.Column("pgn", sa.Text(), nullable=True))
+
+    conn = op.get_bind()
+    select_batch = sa.text(
+        "SELECT game_id, data FROM game_pgn WHERE game_id > :last_id ORDER BY game_id LIMIT :limit"
+    )
+    update_game = sa.text("UPDATE games SET pgn = :pgn WHERE id = :game_id")
+
+    last_id = 0
+    while True:
+        rows = conn.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        conn.execute(
+            update_game,
+            [{"game_id": game_id, "pgn": decompress_text(bytes(data))} for game_id, data in rows],
+        )
+        last_id = rows[-1][0]
+
+    op.drop_table("game_pgn")
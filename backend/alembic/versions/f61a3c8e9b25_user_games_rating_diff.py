@@ -0,0 +1,69 @@
+"""user_games: rating_diff and a rating history index
+
+Revision ID: f61a3c8e9b25
+Revises: c5b8e2f04d71
+Create Date: 2026-10-18 16:09:51.730462
+
+"""
+import logging
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import decompress_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f61a3c8e9b25'
+down_revision: Union[str, Sequence[str], None] = 'c5b8e2f04d71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+BATCH_SIZE = 5000
+
+_RATING_DIFF_TAG = re.compile(r'^\[(White|Black)RatingDiff "([+-]?\d+)"\]', re.MULTILINE)
+
+
+def upgrade() -> None:
+    op.add_column("user_games", sa.Column("rating_diff", sa.SmallInteger(), nullable=True))
+
+    # Recover the rating changes from the PGN tags
+    conn = op.get_bind()
+    select_batch = sa.text(
+        "SELECT ug.id, ug.color, p.data FROM user_games ug JOIN game_pgn p ON p.game_id = ug.game_id "
+        "WHERE ug.id > :last_id AND ug.color IS NOT NULL ORDER BY ug.id LIMIT :limit"
+    )
+    update_link = sa.text("UPDATE user_games SET rating_diff = :rating_diff WHERE id = :id")
+
+    last_id = 0
+    updated = 0
+    while True:
+        rows = conn.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        params = []
+        for link_id, color, data in rows:
+            diffs = {side.lower(): int(diff) for side, diff in _RATING_DIFF_TAG.findall(decompress_text(bytes(data)))}
+            if color in diffs:
+                params.append({"id": link_id, "rating_diff": diffs[color]})
+        if params:
+            conn.execute(update_link, params)
+        updated += len(params)
+        last_id = rows[-1][0]
+        logger.info(f"user_games: recovered {updated} rating changes")
+
+    op.create_index(
+        "ix_user_games_user_id_time_class_played_at",
+        "user_games",
+        ["user_id", "time_class", "played_at"],
+        postgresql_include=["my_rating", "rating_diff", "rated"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_games_user_id_time_class_played_at", table_name="user_games")
+    op.drop_column("user_games", "rating_diff")
@@ -1,3 +1,3 @@
-from app.api import auth, games, profile
+from app.api import auth, games, metrics, profile, sync
 
-__all__ = ["auth", "games", "profile"]
+__all__ = ["auth", "games", "metrics", "profile", "sync"]
@@ -3,16 +3,17 @@ import secrets
 from typing import Optional
 from urllib.parse import urlencode
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.auth import create_access_token, get_current_user
+from app.core import user_cache
+from app.core.auth import create_access_token, decode_access_token, get_current_user
 from app.core.config import get_settings
 from app.core.db import get_session
 from app.services.lichess import exchange_code, generate_pkce, get_account
 from app.models.models import User
-from app.services import crud
+from app.services import crud, profile_cache
 from app.tasks import sync_all_user_games
 
 logger = logging.getLogger(__name__)
@@ -75,7 +76,7 @@ async def auth_callback(
         raise HTTPException(status_code=400, detail="Invalid or expired state")
 
     token = await exchange_code(code, code_verifier)
-    account = await get_account(token.access_token)
+    account = await get_account(token.access_token, interactive=True)
     
     lichess_id = account.get("id")
     username = account.get("username")
@@ -86,6 +87,8 @@ async def auth_callback(
     
     if user:
         user = await crud.update_user_tokens(session, user, username, token)
+        # A returning player is likely to play soon: poll them at the fast rate again
+        await crud.schedule_sync(session, user.id, settings.sync_min_interval, delay=0)
         is_new_user = False
         logger.info(f"Existing user logged in: {username}")
     else:
@@ -94,10 +97,15 @@ async def auth_callback(
         logger.info(f"New user created: {username}")
     
     await session.commit()
+    # Only now: invalidating before the commit would let a concurrent request re-cache the old row
+    await user_cache.invalidate_user(user.id)
+    # Refetched with the new token on the next visit
+    await profile_cache.invalidate(user.id)
     await session.refresh(user)
     
-    # Trigger background task to sync all games for new users
-    if is_new_user:
+    # Backfill the history of new users; resume it for users whose backfill didn't finish
+    sync_state = None if is_new_user else await crud.get_sync_state(session, user.id)
+    if is_new_user or not sync_state or sync_state.backfill_status != "done":
         logger.info(f"Triggering sync_all_user_games for user_id={user.id}")
         sync_all_user_games.delay(user.id)
 
@@ -118,8 +126,14 @@ async def auth_callback(
 
 
 @router.post("/logout")
-async def logout(response: Response):
+async def logout(response: Response, access_token: Optional[str] = Cookie(None)):
     """Logout user."""
+    if access_token:
+        try:
+            payload = decode_access_token(access_token)
+            await user_cache.invalidate_user(int(payload.get("sub", 0)), token=access_token)
+        except HTTPException:
+            pass
     response.delete_cookie(key="access_token")
     return {"message": "Logged out"}
 
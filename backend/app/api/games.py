@@ -1,57 +1,289 @@
+import json
 import logging
-from typing import Optional
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Literal, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.auth import get_current_user
-from app.core.db import get_session
+from app.core.db import AsyncSessionLocal, get_session
 from app.models.models import User
-from app.services import crud
+from app.services import crud, imports
+from app.services.downsample import lttb
+from app.tasks import import_pgn_archive
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/games", tags=["games"])
 
+# Filter values, as stored (see models/types.py): anything else is rejected with 422
+# rather than silently matching the games coded "Unknown"
+TimeClass = Literal["ultraBullet", "bullet", "blitz", "rapid", "classical", "correspondence"]
+Result = Literal["1-0", "0-1", "1/2-1/2"]
+
+
+@router.get("/stats")
+async def get_stats(
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Win/loss/draw totals, overall and by time class and color."""
+    return await crud.get_game_stats(session, user.id)
+
+
+@router.get("/rating-history")
+async def rating_history(
+    time_class: TimeClass,
+    points: int = Query(500, ge=3, le=5000),
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Rating after each rated game in a time class, downsampled (LTTB) to `points` points."""
+    history = await crud.get_rating_history(session, user.id, time_class)
+    sampled = lttb([(played_at.timestamp(), rating) for played_at, rating in history], points)
+    return {
+        "time_class": time_class,
+        "games": len(history),
+        "points": [
+            {
+                "played_at": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+                "rating": int(rating),
+            }
+            for ts, rating in sampled
+        ],
+    }
+
+
+@router.get("/openings")
+async def opening_stats(
+    time_class: Optional[TimeClass] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Results per opening and color: games, wins, draws, losses, average opponent rating.
+
+    Served from the monthly rollup, so `since` / `until` must be the first and the
+    last day of a month (422 otherwise) rather than being silently widened.
+    """
+    if since and since.day != 1:
+        raise HTTPException(status_code=422, detail="since must be the first day of a month")
+    if until and (until + timedelta(days=1)).day != 1:
+        raise HTTPException(status_code=422, detail="until must be the last day of a month")
+    openings = await crud.get_opening_stats(
+        session, user.id, time_class=time_class, since=since, until=until
+    )
+    return {"openings": openings}
+
+
+@router.get("/openings/suggest")
+async def suggest_openings(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Autocomplete for the opening filter: top matching openings with game counts."""
+    suggestions = await crud.suggest_openings(session, user.id, q.strip(), limit)
+    return {"suggestions": suggestions}
+
 
 @router.get("/")
 async def list_games(
     page: int = 1,
     per_page: int = 20,
     opening: Optional[str] = None,
-    result: Optional[str] = None,
-    time_class: Optional[str] = None,
+    result: Optional[Result] = None,
+    time_class: Optional[TimeClass] = None,
+    outcome: Optional[Literal["win", "loss", "draw"]] = None,
+    cursor: Optional[str] = None,
+    count: Literal["exact", "estimated", "none"] = "exact",
+    fields: Optional[str] = None,
     user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
-    """List games with pagination and filtering."""
-    logger.info(f"Fetching games for user {user.username}: page={page}, per_page={per_page}, opening={opening}, result={result}, time_class={time_class}")
-    result = await crud.list_games(
-        session=session,
-        user_id=user.id,
-        page=page,
-        per_page=per_page,
-        opening=opening,
-        result=result,
-        time_class=time_class,
+    """List games with pagination and filtering.
+
+    Pass the `next_cursor` of a response as `cursor` to fetch the following page
+    in constant time; `page` is ignored in that case. Use `count=none` (e.g. for
+    infinite scroll) to skip computing `total`, or `count=estimated` to accept
+    an approximate one when filtering by opening.
+
+    `outcome` filters by the result from the user's side; `result` stays
+    White's point of view ("1-0", "0-1", "1/2-1/2").
+
+    `fields` is a comma-separated subset of the game fields to return (all by
+    default). PGNs are not part of the list: fetch them with `/{game_id}/pgn`.
+    """
+    logger.info(
+        f"Fetching games for user {user.username}: page={page}, per_page={per_page}, "
+        f"opening={opening}, result={result}, time_class={time_class}, outcome={outcome}, "
+        f"cursor={cursor}"
     )
+    selected: tuple[str, ...] = crud.GAME_LIST_FIELDS
+    if fields:
+        selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = set(selected) - set(crud.GAME_LIST_FIELDS)
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+
+    try:
+        listing = await crud.list_games(
+            session=session,
+            user_id=user.id,
+            page=page,
+            per_page=per_page,
+            opening=opening,
+            result=result,
+            time_class=time_class,
+            outcome=outcome,
+            cursor=cursor,
+            count=count,
+            fields=selected,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     
     # Format response
     return {
         "games": [
             {
-                "id": g.id,
-                "game_id": g.game_id,
-                "white": g.white,
-                "black": g.black,
-                "result": g.result,
-                "opening": g.opening,
-                "time_class": g.time_class,
-                "played_at": g.played_at.isoformat() if g.played_at else None,
-                "pgn": g.pgn,
+                field: value.isoformat() if field == "played_at" and value else value
+                for field, value in ((field, getattr(g, field)) for field in selected)
             }
-            for g in result["games"]
+            for g in listing["games"]
         ],
-        "total": result["total"],
-        "page": result["page"],
-        "per_page": result["per_page"],
+        "total": listing["total"],
+        "page": listing["page"],
+        "per_page": listing["per_page"],
+        "next_cursor": listing["next_cursor"],
     }
+
+
+EXPORT_MEDIA_TYPES = {"pgn": "application/x-chess-pgn", "ndjson": "application/x-ndjson"}
+PGN_RESULTS = ("1-0", "0-1", "1/2-1/2")
+
+
+def _pgn_escape(value: str) -> str:
+    """Tag value with backslashes and quotes escaped, as the PGN spec requires."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _export_pgn(row) -> str:
+    """The stored PGN, or a headers-only one if the game has none."""
+    if row.pgn:
+        return row.pgn.strip() + "\n\n\n"
+    result = row.result if row.result in PGN_RESULTS else "*"
+    tags = {
+        "Site": f"https://lichess.org/{row.game_id}",
+        "Date": row.played_at.strftime("%Y.%m.%d") if row.played_at else "????.??.??",
+        "White": row.white,
+        "Black": row.black,
+        "Result": result,
+        "Opening": row.opening,
+    }
+    headers = "".join(f'[{tag} "{_pgn_escape(value)}"]\n' for tag, value in tags.items() if value)
+    return f"{headers}\n{result}\n\n\n"
+
+
+def _export_ndjson(row) -> str:
+    game = {field: getattr(row, field) for field in crud.GAME_LIST_FIELDS}
+    if game["played_at"]:
+        game["played_at"] = game["played_at"].isoformat()
+    return json.dumps(game) + "\n"
+
+
+async def _export_games(user_id: int, format: str, filters: dict) -> AsyncIterator[str]:
+    # Own session: the request's one is closed before a streamed body is sent
+    serialize = _export_pgn if format == "pgn" else _export_ndjson
+    async with AsyncSessionLocal() as session:
+        async for row in crud.stream_games_for_export(
+            session, user_id, with_pgn=format == "pgn", **filters
+        ):
+            yield serialize(row)
+
+
+@router.get("/export")
+async def export_games(
+    format: Literal["pgn", "ndjson"] = "pgn",
+    opening: Optional[str] = None,
+    result: Optional[Result] = None,
+    time_class: Optional[TimeClass] = None,
+    outcome: Optional[Literal["win", "loss", "draw"]] = None,
+    user: User = Depends(get_current_user),
+):
+    """Download the user's games (list filters apply), newest first, as PGN or NDJSON.
+
+    Rows are streamed from a server-side cursor, so memory use doesn't depend
+    on the number of games.
+    """
+    logger.info(
+        f"Exporting games for user {user.username}: format={format}, opening={opening}, "
+        f"result={result}, time_class={time_class}, outcome={outcome}"
+    )
+    filters = {"opening": opening, "result": result, "time_class": time_class, "outcome": outcome}
+    return StreamingResponse(
+        _export_games(user.id, format, filters),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{user.username}-games.{format}"'},
+    )
+
+
+@router.post("/import", status_code=202)
+async def import_games(
+    file: UploadFile = File(...),
+    player: Optional[str] = Form(None),
+    user: User = Depends(get_current_user),
+):
+    """Import a PGN archive (e.g. a Lichess monthly dump or another site's export).
+
+    The upload is parsed in the background; poll `/import/{job_id}` for progress.
+    `player` is the user's name in the archive, if it isn't their Lichess
+    username. Games the user didn't play, or that are already in their
+    history, are skipped.
+    """
+    job_id = uuid.uuid4().hex
+    try:
+        size = await run_in_threadpool(imports.spool_upload, file.file, job_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    finally:
+        await file.close()
+
+    await imports.create_job(job_id, user.id, player, size)
+    import_pgn_archive.delay(job_id)
+    logger.info(
+        f"Queued PGN import {job_id} for user {user.username}: {size} bytes, player={player}"
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/import/{job_id}")
+async def import_status(
+    job_id: str,
+    user: User = Depends(get_current_user),
+):
+    """Status and progress of a PGN import."""
+    job = await imports.get_job(job_id)
+    if not job or job["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.get("/{game_id}/pgn", response_class=PlainTextResponse)
+async def get_game_pgn(
+    game_id: str,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """PGN of one game, fetched on demand."""
+    pgn = await crud.get_game_pgn(session, user.id, game_id)
+    if pgn is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    return PlainTextResponse(pgn, media_type="application/x-chess-pgn")
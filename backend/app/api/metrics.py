@@ -0,0 +1,20 @@
+import logging
+
+from fastapi import APIRouter
+
+from app.core import user_cache
+from app.services import lichess, metrics
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/")
+async def get_metrics():
+    """Operational metrics for monitoring."""
+    return {
+        "sync_runs": await metrics.recent_sync_runs(),
+        "profile_cache": await metrics.get_counters(metrics.PROFILE_CACHE_KEY),
+        "lichess": await lichess.get_status(),
+        "auth_cache": user_cache.stats(),  # this API process only
+    }
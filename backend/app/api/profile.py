@@ -2,7 +2,8 @@ import logging
 from fastapi import APIRouter, Depends
 
 from app.core.auth import get_current_user
-from app.services.lichess import get_account
+from app.core.db import AsyncSessionLocal
+from app.services import crud, profile_cache
 from app.models.models import User
 
 logger = logging.getLogger(__name__)
@@ -11,9 +12,15 @@ router = APIRouter(prefix="/profile", tags=["profile"])
 
 @router.get("/")
 async def get_profile(user: User = Depends(get_current_user)):
-    """Get user profile from Lichess API."""
+    """Get user profile from Lichess API (cached, see services/profile_cache.py)."""
     logger.info(f"Fetching profile for user {user.username}")
-    profile = await get_account(user.access_token)
+
+    async def load_token() -> str:
+        # Own session: a background refresh can outlive this request
+        async with AsyncSessionLocal() as session:
+            return await crud.get_access_token(session, user.id)
+
+    profile = await profile_cache.get_profile(user.id, load_token)
     
     # Extract ratings from perfs
     ratings = {}
@@ -0,0 +1,75 @@
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.auth import get_current_user
+from app.core.db import get_session
+from app.models.models import User
+from app.services import crud
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+def _from_ms(value: Optional[int]) -> Optional[str]:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).isoformat() if value else None
+
+
+@router.get("/status")
+async def sync_status(
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """Progress of the user's history backfill (overall and per time window).
+
+    Also returns the sync watermark and when the next periodic sync is due.
+    """
+    state = await crud.get_sync_state(session, user.id)
+    if not state:
+        return {
+            "backfill": {"status": "pending"},
+            "last_game_at": None,
+            "next_sync_at": None,
+            "updated_at": None,
+        }
+    windows = await crud.get_backfill_windows(session, user.id)
+
+    progress = None
+    if state.backfill_status == "done":
+        progress = 1.0
+    elif state.backfill_total:
+        progress = min(state.backfill_games / state.backfill_total, 1.0)
+    return {
+        "backfill": {
+            "status": state.backfill_status or "pending",
+            "games_processed": state.backfill_games,
+            "games_total": state.backfill_total,
+            "progress": round(progress, 3) if progress is not None else None,
+            "windows_total": len(windows),
+            "windows_done": sum(window.status == "done" for window in windows),
+            "windows": [
+                {
+                    "since": _from_ms(window.since),
+                    "until": _from_ms(window.until),
+                    "status": window.status,
+                    "games": window.games,
+                    "synced_back_to": _from_ms(window.checkpoint),
+                }
+                for window in windows
+            ],
+            "started_at": state.backfill_started_at.isoformat()
+            if state.backfill_started_at
+            else None,
+            "finished_at": state.backfill_finished_at.isoformat()
+            if state.backfill_finished_at
+            else None,
+            "error": state.backfill_error,
+        },
+        "last_game_at": _from_ms(state.last_game_at),
+        "next_sync_at": state.next_sync_at.isoformat() if state.next_sync_at else None,
+        "sync_interval": state.sync_interval,
+        "updated_at": state.updated_at.isoformat() if state.updated_at else None,
+    }
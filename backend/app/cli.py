@@ -0,0 +1,69 @@
+"""Maintenance commands.
+
+Usage:
+    python -m app.cli rebuild-stats [--user-id ID]
+    python -m app.cli pgn-report
+"""
+import argparse
+import asyncio
+import logging
+
+from sqlalchemy import select
+
+from app.core.db import AsyncSessionLocal
+from app.models.models import User
+from app.services import crud
+
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_stats(user_id: int | None = None) -> None:
+    """Recompute per-user game counters and opening rollups from the games (default: all users)."""
+    async with AsyncSessionLocal() as session:
+        if user_id is None:
+            result = await session.execute(select(User.id).order_by(User.id))
+            user_ids = list(result.scalars().all())
+        else:
+            user_ids = [user_id]
+
+        for uid in user_ids:
+            await crud.rebuild_game_stats(session, uid)
+            await crud.rebuild_opening_stats(session, uid)
+            await session.commit()
+            logger.info(f"rebuild-stats: Rebuilt stats for user_id={uid}")
+
+
+async def pgn_report() -> None:
+    """Print how much space PGN compression saves."""
+    async with AsyncSessionLocal() as session:
+        report = await crud.pgn_storage_report(session)
+    print(
+        f"{report['games']} PGNs: {report['raw_bytes']} bytes raw, "
+        f"{report['stored_bytes']} bytes stored, {report['saved_bytes']} bytes saved "
+        f"(ratio {report['ratio']})"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser(
+        "rebuild-stats", help="Rebuild user_game_stats and user_opening_stats from games"
+    )
+    rebuild.add_argument("--user-id", type=int, default=None)
+
+    commands.add_parser("pgn-report", help="Report bytes saved by PGN compression")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "rebuild-stats":
+        asyncio.run(rebuild_stats(args.user_id))
+    elif args.command == "pgn-report":
+        asyncio.run(pgn_report())
+
+
+if __name__ == "__main__":
+    main()
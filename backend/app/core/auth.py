@@ -3,9 +3,9 @@ from typing import Optional
 
 import jwt
 from fastapi import Cookie, Depends, HTTPException, status
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import user_cache
 from app.core.config import get_settings
 from app.core.db import get_session
 from app.models.models import User
@@ -28,8 +28,12 @@ def create_access_token(user_id: int, username: str) -> str:
 
 
 def decode_access_token(token: str) -> dict:
+    payload = user_cache.get_token_payload(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
+        user_cache.set_token_payload(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
@@ -47,8 +51,7 @@ async def get_current_user(
     payload = decode_access_token(access_token)
     user_id = int(payload.get("sub", 0))
 
-    result = await session.execute(select(User).where(User.id == user_id))
-    user = result.scalars().first()
+    user = await user_cache.get_user(session, user_id)
 
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
@@ -67,7 +70,6 @@ async def get_current_user_optional(
         payload = decode_access_token(access_token)
         user_id = int(payload.get("sub", 0))
 
-        result = await session.execute(select(User).where(User.id == user_id))
-        return result.scalars().first()
+        return await user_cache.get_user(session, user_id)
     except HTTPException:
         return None
@@ -17,6 +17,63 @@ class Settings(BaseSettings):
     celery_broker_url: str = "redis://redis:6379/0"
     celery_result_backend: str = "redis://redis:6379/0"
 
+    # Shared Lichess HTTP client (app/services/lichess.py)
+    lichess_timeout: float = 30.0
+    lichess_connect_timeout: float = 10.0
+    lichess_max_connections: int = 20
+    lichess_max_keepalive_connections: int = 10
+    lichess_keepalive_expiry: float = 60.0
+    lichess_http2: bool = False  # requires the `h2` package
+
+    # Global request budget to lichess.org shared by all processes (token bucket in Redis)
+    lichess_rate_limit: float = 5.0  # requests per second
+    lichess_rate_burst: int = 10
+    # Game export streams open at once across all workers (parallel history backfill)
+    lichess_max_streams: int = 4
+    # Failure handling, shared by all processes through Redis (see app/services/lichess.py)
+    lichess_cooldown: float = 60.0  # pause after a 429, unless Lichess sends Retry-After
+    lichess_max_retries: int = 3  # per request, for 5xx / network errors / 429
+    lichess_backoff_base: float = 1.0  # seconds, full-jitter exponential backoff
+    lichess_backoff_max: float = 30.0
+    lichess_retry_budget: float = 0.2  # retries per second across all workers
+    lichess_retry_burst: int = 10
+    lichess_breaker_threshold: int = 10  # failures within the window open the circuit
+    lichess_breaker_window: float = 60.0
+    lichess_breaker_open: float = 120.0  # seconds all Lichess calls are paused
+
+    # Lichess profile cache (app/services/profile_cache.py), seconds
+    profile_cache_ttl: int = 300  # served as fresh
+    profile_cache_stale_ttl: int = 3600  # then served stale while refreshing
+
+    # Authenticated-user cache (app/core/user_cache.py)
+    auth_cache_ttl: int = 60  # seconds
+    auth_cache_size: int = 10000
+    auth_cache_redis: bool = False  # share cached users between API instances
+
+    # Max users synced concurrently inside one Celery worker process
+    sync_concurrency: int = 8
+    # Periodic sync jobs waiting longer than this (seconds) are skipped
+    sync_max_queue_lag: float = 60.0
+    # Per-user periodic sync interval, seconds: the minimum after new games, then
+    # multiplied by sync_backoff_factor per empty sync up to the maximum
+    sync_min_interval: int = 60
+    sync_max_interval: int = 6 * 60 * 60
+    sync_backoff_factor: float = 2.0
+    # Lichess exports only finished games, filtered by start time: correspondence games
+    # started this long (seconds) before the watermark are re-read to catch those that
+    # finished since. Real-time games start after the previous one, so they need none.
+    sync_correspondence_overlap: int = 60 * 24 * 60 * 60
+    # History backfill is split into time windows of about this many games, synced in parallel
+    backfill_window_games: int = 5000
+    backfill_max_windows: int = 32
+    # Share of lichess_rate_limit (requests/s) that backfill streams may hold open at once;
+    # the rest is left to periodic sync and user-facing calls
+    backfill_rate_share: float = 0.5
+
+    # PGN archive imports: uploads are spooled here for the worker (shared volume)
+    import_dir: str = "/tmp/lichess-imports"
+    import_max_bytes: int = 1024 * 1024 * 1024
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", case_sensitive=False)
 
 
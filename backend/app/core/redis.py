@@ -0,0 +1,25 @@
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from app.core.config import get_settings
+
+
+settings = get_settings()
+
+_client: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Get the process-wide async Redis client (created lazily from `redis_url`)."""
+    global _client
+    if _client is None:
+        _client = aioredis.from_url(settings.redis_url, decode_responses=True)
+    return _client
+
+
+async def close_redis() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,144 @@
+"""Cache of decoded access tokens and authenticated users.
+
+Lets `get_current_user` skip the per-request `SELECT User`. Users are kept in
+an in-process TTL/LRU cache; with `auth_cache_redis` enabled, Redis acts as a
+second level shared by all API instances. Explicit invalidation (token
+updates, logout) drops both levels; other instances' in-process entries stay
+valid for at most `auth_cache_ttl` seconds.
+
+Only the identity columns (`CACHED_COLUMNS`) are cached, so OAuth tokens never
+reach Redis; a cached user's other attributes are unloaded. Code that needs
+the Lichess token reads it from the DB (`crud.get_access_token`).
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.core.config import get_settings
+from app.core.redis import get_redis
+from app.models.models import User
+
+
+settings = get_settings()
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+USER_KEY = "cache:user:{user_id}"
+CACHED_COLUMNS = ("id", "lichess_id", "username")
+
+
+class TTLCache(Generic[K, V]):
+    """Small LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_tokens: TTLCache[str, Dict[str, Any]] = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
+_users: TTLCache[int, User] = TTLCache(settings.auth_cache_size, settings.auth_cache_ttl)
+_stats = {"token_hits": 0, "token_misses": 0, "user_hits": 0, "user_misses": 0}
+
+
+def get_token_payload(token: str) -> Optional[Dict[str, Any]]:
+    payload = _tokens.get(token)
+    _stats["token_hits" if payload is not None else "token_misses"] += 1
+    return payload
+
+
+def set_token_payload(token: str, payload: Dict[str, Any]) -> None:
+    ttl = settings.auth_cache_ttl
+    if exp := payload.get("exp"):
+        ttl = min(ttl, exp - time.time())
+    if ttl > 0:
+        _tokens.set(token, payload, ttl)
+
+
+def _detached_copy(values: Dict[str, Any]) -> User:
+    user = User(**values)
+    make_transient_to_detached(user)
+    return user
+
+
+def _column_values(user: User) -> Dict[str, Any]:
+    return {key: getattr(user, key) for key in CACHED_COLUMNS}
+
+
+async def get_user(session: AsyncSession, user_id: int) -> Optional[User]:
+    """Get a user attached to `session`, from cache when possible."""
+    cached = _users.get(user_id)
+    if cached is None and settings.auth_cache_redis:
+        raw = await get_redis().get(USER_KEY.format(user_id=user_id))
+        if raw:
+            cached = _detached_copy(json.loads(raw))
+            _users.set(user_id, cached)
+
+    if cached is not None:
+        _stats["user_hits"] += 1
+        # Attach a copy to the session without a round trip
+        return await session.merge(cached, load=False)
+
+    _stats["user_misses"] += 1
+    result = await session.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
+    if user is None:
+        return None
+
+    values = _column_values(user)
+    _users.set(user_id, _detached_copy(values))
+    if settings.auth_cache_redis:
+        await get_redis().set(
+            USER_KEY.format(user_id=user_id), json.dumps(values), ex=settings.auth_cache_ttl
+        )
+    return user
+
+
+async def invalidate_user(user_id: int, token: Optional[str] = None) -> None:
+    """Drop a cached user (and optionally one of its tokens) from every cache level."""
+    _users.pop(user_id)
+    if token:
+        _tokens.pop(token)
+    if settings.auth_cache_redis:
+        await get_redis().delete(USER_KEY.format(user_id=user_id))
+
+
+def stats() -> Dict[str, Any]:
+    """Hit/miss counters of this process."""
+    lookups = _stats["user_hits"] + _stats["user_misses"]
+    return {
+        **_stats,
+        "user_hit_rate": round(_stats["user_hits"] / lookups, 3) if lookups else None,
+        "users_cached": len(_users),
+        "tokens_cached": len(_tokens),
+    }
@@ -1,12 +1,27 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 
 from app.core.config import get_settings
-from app.api import auth, games, profile
+from app.core.redis import close_redis
+from app.api import auth, games, metrics, profile, sync
+from app.services import lichess
 
 settings = get_settings()
 
-app = FastAPI(title="Lichess Stats")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lichess.init_client()
+    yield
+    await lichess.close_client()
+    await close_redis()
+
+
+app = FastAPI(title="Lichess Stats", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,9 +31,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+@app.exception_handler(lichess.LichessUnavailableError)
+async def lichess_unavailable(request: Request, exc: lichess.LichessUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
 app.include_router(auth.router, prefix="/api")
 app.include_router(profile.router, prefix="/api")
 app.include_router(games.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
+app.include_router(sync.router, prefix="/api")
 
 
 @app.get("/health")
@@ -1,3 +1,23 @@
-from app.models.models import Game, User
+from app.models.models import (
+    BackfillWindow,
+    Game,
+    GamePgn,
+    Opening,
+    SyncState,
+    User,
+    UserGame,
+    UserGameStats,
+    UserOpeningStats,
+)
 
-__all__ = ["Game", "User"]
+__all__ = [
+    "BackfillWindow",
+    "Game",
+    "GamePgn",
+    "Opening",
+    "SyncState",
+    "User",
+    "UserGame",
+    "UserGameStats",
+    "UserOpeningStats",
+]
@@ -1,10 +1,23 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    SmallInteger,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.db import Base
+from app.models.types import OUTCOMES, RESULTS, TIME_CLASSES, CompressedText, SmallCode
 
 
 class User(Base):
@@ -21,21 +34,197 @@ class User(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    games: Mapped[list["Game"]] = relationship("Game", back_populates="user", cascade="all, delete-orphan")
+    user_games: Mapped[list["UserGame"]] = relationship(
+        "UserGame", back_populates="user", cascade="all, delete-orphan"
+    )
+
+
+class Opening(Base):
+    """Opening names, stored once and referenced from games by id."""
+
+    __tablename__ = "openings"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    eco: Mapped[Optional[str]] = mapped_column(String(3))
 
 
 class Game(Base):
+    """A Lichess game, stored once no matter how many of our users played in it."""
+
     __tablename__ = "games"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
     game_id: Mapped[str] = mapped_column(String(64), unique=True, nullable=False, index=True)
     white: Mapped[str] = mapped_column(String(64))
     black: Mapped[str] = mapped_column(String(64))
-    result: Mapped[str] = mapped_column(String(16))
-    opening: Mapped[str] = mapped_column(String(255))
-    time_class: Mapped[str] = mapped_column(String(32))
+    result: Mapped[str] = mapped_column(SmallCode(RESULTS))
+    opening_id: Mapped[Optional[int]] = mapped_column(ForeignKey("openings.id"), index=True)
+    time_class: Mapped[str] = mapped_column(SmallCode(TIME_CLASSES))
     played_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), index=True)
-    pgn: Mapped[Optional[str]] = mapped_column(Text)
+    # From an uploaded archive: untrusted, replaced when the game is fetched from Lichess
+    imported: Mapped[bool] = mapped_column(
+        Boolean, nullable=False, default=False, server_default="false"
+    )
+
+    opening: Mapped[Optional[Opening]] = relationship("Opening")
+    user_games: Mapped[list["UserGame"]] = relationship("UserGame", back_populates="game")
+
+
+class UserGame(Base):
+    """A game in one user's history, with that user's perspective on it."""
+
+    __tablename__ = "user_games"
+    __table_args__ = (UniqueConstraint("user_id", "game_id", name="uq_user_games_user_id_game_id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    game_id: Mapped[int] = mapped_column(
+        ForeignKey("games.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    # Copy of Game.played_at
+    played_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Copy of Game.time_class
+    time_class: Mapped[Optional[str]] = mapped_column(SmallCode(TIME_CLASSES))
+    # The user's side of the game, computed once at ingestion
+    color: Mapped[Optional[str]] = mapped_column(String(5))  # white / black
+    outcome: Mapped[Optional[str]] = mapped_column(SmallCode(OUTCOMES))  # win / loss / draw
+    opponent: Mapped[Optional[str]] = mapped_column(String(64))
+    my_rating: Mapped[Optional[int]] = mapped_column(Integer)  # before the game
+    rating_diff: Mapped[Optional[int]] = mapped_column(SmallInteger)  # my rating change
+    opponent_rating: Mapped[Optional[int]] = mapped_column(Integer)
+    rated: Mapped[Optional[bool]] = mapped_column(Boolean)
+
+    user: Mapped[User] = relationship("User", back_populates="user_games")
+    game: Mapped[Game] = relationship("Game", back_populates="user_games")
+
+
+class GamePgn(Base):
+    """PGN of a game, kept out of the hot `games` rows and stored compressed."""
+
+    __tablename__ = "game_pgn"
+
+    game_id: Mapped[int] = mapped_column(
+        ForeignKey("games.id", ondelete="CASCADE"), primary_key=True
+    )
+    pgn: Mapped[str] = mapped_column("data", CompressedText, nullable=False)
+    raw_size: Mapped[int] = mapped_column(Integer, nullable=False)  # uncompressed bytes
+
+
+# Keyset pagination of a user's games, newest first (see crud.list_games)
+Index(
+    "ix_user_games_user_id_played_at_id",
+    UserGame.user_id,
+    UserGame.played_at.desc().nulls_last(),
+    UserGame.id.desc(),
+)
+# Outcome / time class filters and stats as index-only scans
+Index(
+    "ix_user_games_user_id_outcome_time_class_played_at",
+    UserGame.user_id,
+    UserGame.outcome,
+    UserGame.time_class,
+    UserGame.played_at,
+)
+# Rating history per time class, index-only (see crud.get_rating_history)
+Index(
+    "ix_user_games_user_id_time_class_played_at",
+    UserGame.user_id,
+    UserGame.time_class,
+    UserGame.played_at,
+    postgresql_include=["my_rating", "rating_diff", "rated"],
+)
+# Substring / fuzzy opening search (pg_trgm)
+Index(
+    "ix_openings_name_trgm",
+    Opening.name,
+    postgresql_using="gin",
+    postgresql_ops={"name": "gin_trgm_ops"},
+)
+
+
+class SyncState(Base):
+    """Per-user sync progress. `last_game_at` is the watermark for incremental sync."""
+
+    __tablename__ = "sync_state"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    last_game_at: Mapped[Optional[int]] = mapped_column(BigInteger)  # Lichess createdAt, ms
+    last_game_id: Mapped[Optional[str]] = mapped_column(String(64))
+    # Full-history backfill, split into BackfillWindow rows synced in parallel
+    backfill_status: Mapped[Optional[str]] = mapped_column(String(16))  # running / done / failed
+    # Games processed
+    backfill_games: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    backfill_total: Mapped[Optional[int]] = mapped_column(Integer)  # games on the Lichess account
+    backfill_error: Mapped[Optional[str]] = mapped_column(Text)
+    backfill_started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    backfill_finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Adaptive periodic sync: short interval for active players, backed off for idle ones
+    # next_sync_at NULL: due now
+    next_sync_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), index=True)
+    sync_interval: Mapped[Optional[int]] = mapped_column(Integer)  # seconds
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+
+class BackfillWindow(Base):
+    """A time slice of a user's history backfill, synced newest to oldest by its own task."""
+
+    __tablename__ = "backfill_windows"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    # Lichess createdAt, ms; since and until are inclusive
+    since: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    until: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # Oldest createdAt saved; resume point
+    checkpoint: Mapped[Optional[int]] = mapped_column(BigInteger)
+    games: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Status: pending / running / done / failed
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending")
+    # Celery task id of the task that last claimed the window
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(155))
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+
+class UserGameStats(Base):
+    """Per-user game counters maintained at ingestion, one row per (time_class, color, outcome)."""
+
+    __tablename__ = "user_game_stats"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    time_class: Mapped[str] = mapped_column(SmallCode(TIME_CLASSES), primary_key=True)
+    color: Mapped[str] = mapped_column(String(5), primary_key=True)  # white / black
+    outcome: Mapped[str] = mapped_column(SmallCode(OUTCOMES), primary_key=True)  # win / loss / draw
+    games: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class UserOpeningStats(Base):
+    """Per-user monthly rollup by opening, color and time class, maintained at ingestion."""
+
+    __tablename__ = "user_opening_stats"
 
-    user: Mapped[User] = relationship("User", back_populates="games")
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    opening_id: Mapped[int] = mapped_column(ForeignKey("openings.id"), primary_key=True)
+    color: Mapped[str] = mapped_column(String(5), primary_key=True)  # white / black
+    time_class: Mapped[str] = mapped_column(SmallCode(TIME_CLASSES), primary_key=True)
+    month: Mapped[date] = mapped_column(Date, primary_key=True)  # first day of the month, UTC
+    games: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    wins: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    draws: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    losses: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Average opponent rating = opponent_rating_sum / rated_opponents
+    opponent_rating_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    rated_opponents: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,104 @@
+"""Custom column types."""
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import LargeBinary, SmallInteger
+from sqlalchemy.types import TypeDecorator
+
+
+# Preset deflate dictionary for PGNs: the tag pairs and move-text fragments that
+# nearly every Lichess PGN repeats. Deflate finds matches closer to the end of
+# the dictionary more cheaply, so the most common fragments come last.
+#
+# Stored data is prefixed with the codec byte it was compressed with. Never edit
+# a published dictionary: add a new codec id and keep the old one decodable.
+PGN_DICT_V1 = (
+    b'[Variant "Standard"]\n[Variant "Chess960"]\n[FEN "'
+    b'[Termination "Abandoned"]\n[Termination "Rules infraction"]\n'
+    b'[Event "Casual Bullet game"]\n[Event "Casual Blitz game"]\n[Event "Casual Rapid game"]\n'
+    b'[Event "Rated Correspondence game"]\n[Event "Rated Classical game"]\n'
+    b'[Event "Rated Bullet game"]\n[Event "Rated Rapid game"]\n'
+    b'[TimeControl "60+0"]\n[TimeControl "300+0"]\n[TimeControl "600+0"]\n[TimeControl "180+2"]\n'
+    b'[TimeControl "180+0"]\n[TimeControl "-"]\n'
+    b' O-O-O O-O Qxd5 Nxe5 Bxf7+ Rxe8+ Qxf7# exd5 cxd4 Nxd4 Bxc6 bxc6 dxc6 '
+    b'1. d4 d5 2. c4 e6 3. Nc3 Nf6 1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 '
+    b'1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 3. Bc4 Bc5 4. c3 '
+    b' 1-0\n\n 0-1\n\n 1/2-1/2\n\n'
+    b'[Termination "Time forfeit"]\n[Termination "Normal"]\n'
+    b'[ECO "A00"]\n[ECO "B'
+    b'[Opening "Queen\'s Pawn Game'
+    b'[Opening "Sicilian Defense: '
+    b'[Opening "'
+    b'[WhiteRatingDiff "+'
+    b'[BlackRatingDiff "-'
+    b'[WhiteTitle "'
+    b'[WhiteElo "1'
+    b'[BlackElo "1'
+    b'[UTCTime "'
+    b'[UTCDate "20'
+    b'[Result "1/2-1/2"]\n[Result "0-1"]\n[Result "1-0"]\n'
+    b'[Black "'
+    b'[White "'
+    b'[Date "20'
+    b'[Site "https://lichess.org/'
+    b'[Event "Rated Blitz game"]\n'
+)
+
+CODEC_DEFLATE = 0
+CODEC_DEFLATE_PGN_V1 = 1
+
+_DICTIONARIES = {CODEC_DEFLATE: None, CODEC_DEFLATE_PGN_V1: PGN_DICT_V1}
+_CURRENT_CODEC = CODEC_DEFLATE_PGN_V1
+
+
+def compress_text(value: str, codec: int = _CURRENT_CODEC) -> bytes:
+    """Raw deflate (no zlib header/checksum), optionally with a preset dictionary."""
+    zdict = _DICTIONARIES[codec]
+    kwargs: Dict[str, Any] = {"zdict": zdict} if zdict else {}
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, 9, **kwargs)
+    return bytes([codec]) + compressor.compress(value.encode()) + compressor.flush()
+
+
+def decompress_text(data: bytes) -> str:
+    zdict = _DICTIONARIES[data[0]]
+    kwargs: Dict[str, Any] = {"zdict": zdict} if zdict else {}
+    decompressor = zlib.decompressobj(-15, **kwargs)
+    return (decompressor.decompress(data[1:]) + decompressor.flush()).decode()
+
+
+class CompressedText(TypeDecorator):
+    """Text stored compressed in a BYTEA column, transparently (de)compressed."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        return None if value is None else compress_text(value)
+
+    def process_result_value(self, value: Optional[bytes], dialect) -> Optional[str]:
+        return None if value is None else decompress_text(bytes(value))
+
+
+# Append-only code tables for SmallCode columns: a value's code is its position.
+# Code 0 is the fallback for values not listed (yet).
+TIME_CLASSES = ("Unknown", "ultraBullet", "bullet", "blitz", "rapid", "classical", "correspondence")
+RESULTS = ("Unknown", "1-0", "0-1", "1/2-1/2")
+OUTCOMES = ("Unknown", "win", "loss", "draw")
+
+
+class SmallCode(TypeDecorator):
+    """A low-cardinality string stored as its SMALLINT code in `values`."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, values: Tuple[str, ...]):
+        super().__init__()
+        self.values = values
+        self._codes = {value: code for code, value in enumerate(values)}
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[int]:
+        return None if value is None else self._codes.get(value, 0)
+
+    def process_result_value(self, value: Optional[int], dialect) -> Optional[str]:
+        return None if value is None else self.values[value]
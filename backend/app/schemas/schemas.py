@@ -37,14 +37,20 @@ class GamePublic(BaseModel):
     opening: str
     time_class: str
     played_at: Optional[datetime] = None
-    pgn: Optional[str] = None
+    color: Optional[str] = None
+    outcome: Optional[str] = None
+    opponent: Optional[str] = None
+    my_rating: Optional[int] = None
+    opponent_rating: Optional[int] = None
+    rated: Optional[bool] = None
 
 
 class GamesResponse(BaseModel):
     games: list[GamePublic]
-    total: int
+    total: Optional[int] = None
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
 
 
 class SyncRequest(BaseModel):
@@ -1,6 +1,13 @@
+import asyncio
+from typing import Any, Coroutine, Optional, TypeVar
+
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 
 from app.core.config import get_settings
+from app.core.db import engine
+from app.core.redis import close_redis
+from app.services import lichess
 
 settings = get_settings()
 
@@ -10,11 +17,48 @@ celery_app = Celery(
     backend=settings.celery_result_backend,
 )
 
+# Enqueues only the users whose own next sync is due (see sync.next_sync_interval)
 celery_app.conf.beat_schedule = {
     "sync-games": {
         "task": "app.tasks.sync_recent_games",
         "schedule": 60.0,
-    }
+    },
+    "resume-backfills": {
+        "task": "app.tasks.resume_backfills",
+        "schedule": 15 * 60.0,
+    },
 }
 
 celery_app.autodiscover_tasks(["app.tasks"])
+
+T = TypeVar("T")
+
+# Persistent event loop of the worker process: the shared Lichess client's and
+# the async DB engine's connection pools are bound to the loop they were first used on.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine to completion on the worker's persistent event loop."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # Don't reuse DB connections inherited from the parent process
+    run_async(engine.dispose(close=False))
+    lichess.init_client()
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    if _loop is None or _loop.is_closed():
+        return
+    _loop.run_until_complete(lichess.close_client())
+    _loop.run_until_complete(engine.dispose())
+    _loop.run_until_complete(close_redis())
+    _loop.close()
@@ -1,12 +1,41 @@
 """CRUD operations for database models."""
+import base64
+import binascii
+import json
 import logging
-from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Sequence
 
-from sqlalchemy import and_, func, select
+from sqlalchemy import (
+    Date,
+    Integer,
+    and_,
+    case,
+    delete,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
 
-from app.models.models import Game, User
+from app.models.models import (
+    BackfillWindow,
+    Game,
+    GamePgn,
+    Opening,
+    SyncState,
+    User,
+    UserGame,
+    UserGameStats,
+    UserOpeningStats,
+)
 from app.schemas.schemas import TokenPayload
 
 
@@ -21,6 +50,12 @@ async def get_user_by_id(session: AsyncSession, user_id: int) -> Optional[User]:
     return result.scalars().first()
 
 
+async def get_access_token(session: AsyncSession, user_id: int) -> str:
+    """The user's Lichess OAuth token (not part of the cached user, see core/user_cache.py)."""
+    result = await session.execute(select(User.access_token).where(User.id == user_id))
+    return result.scalar_one()
+
+
 async def get_user_by_lichess_id(session: AsyncSession, lichess_id: str) -> Optional[User]:
     """Get user by Lichess ID."""
     result = await session.execute(select(User).where(User.lichess_id == lichess_id))
@@ -59,7 +94,7 @@ async def update_user_tokens(
     username: str,
     token: TokenPayload,
 ) -> User:
-    """Update user tokens."""
+    """Update user tokens. The caller drops the cached user once it has committed."""
     expires_at = None
     if token.expires_in:
         expires_at = datetime.now(timezone.utc) + timedelta(seconds=token.expires_in)
@@ -77,75 +112,930 @@ async def update_user_tokens(
 
 # Game CRUD operations
 
-async def list_games(
+async def upsert_openings(
+    session: AsyncSession, openings: Dict[str, Optional[str]]
+) -> Dict[str, int]:
+    """Make sure the openings exist (name -> ECO code). Returns name -> opening id.
+
+    A missing ECO code is filled in when a later game provides one.
+    """
+    if not openings:
+        return {}
+    stmt = pg_insert(Opening)
+    upsert = stmt.on_conflict_do_update(
+        index_elements=[Opening.name],
+        set_={"eco": func.coalesce(Opening.eco, stmt.excluded.eco)},
+    ).returning(Opening.name, Opening.id)
+    result = await session.execute(
+        upsert, [{"name": name, "eco": eco} for name, eco in sorted(openings.items())]
+    )
+    return dict(result.tuples().all())
+
+
+async def get_game_ids(
     session: AsyncSession,
+    lichess_ids: Sequence[str],
+    include_imported: bool = True,
+) -> Dict[str, int]:
+    """Map the Lichess ids of already stored games to their primary keys.
+
+    With `include_imported=False` games that only came from uploaded archives
+    are left out, as if they weren't stored yet.
+    """
+    if not lichess_ids:
+        return {}
+    query = select(Game.game_id, Game.id).where(Game.game_id.in_(lichess_ids))
+    if not include_imported:
+        query = query.where(Game.imported.is_(False))
+    result = await session.execute(query)
+    return dict(result.tuples().all())
+
+
+async def insert_games(
+    session: AsyncSession, rows: List[Dict], imported: bool = False
+) -> Dict[str, int]:
+    """Bulk insert shared game rows. Returns Lichess id -> primary key for all given rows.
+
+    The whole batch is written with a single INSERT ... ON CONFLICT RETURNING.
+    A row's optional "pgn" goes to the compressed game_pgn side table. Games
+    inserted concurrently by another sync are looked up instead.
+
+    Rows from an uploaded archive (`imported`) never touch an existing game.
+    Rows fetched from Lichess replace an existing game that came from an
+    archive, so an upload can't forge a game other users will be linked to.
+    """
+    if not rows:
+        return {}
+
+    pgns = {row["game_id"]: row["pgn"] for row in rows if row.get("pgn")}
+    game_rows = [
+        {**{k: v for k, v in row.items() if k != "pgn"}, "imported": imported} for row in rows
+    ]
+    stmt = pg_insert(Game)
+    if imported:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Game.game_id])
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Game.game_id],
+            set_={key: getattr(stmt.excluded, key) for key in game_rows[0] if key != "game_id"},
+            where=Game.imported.is_(True),
+        )
+    result = await session.execute(stmt.returning(Game.game_id, Game.id), game_rows)
+    ids = dict(result.tuples().all())
+
+    pgn_rows = [
+        {"game_id": id_, "pgn": pgns[game_id], "raw_size": len(pgns[game_id].encode())}
+        for game_id, id_ in ids.items()
+        if game_id in pgns
+    ]
+    if pgn_rows:
+        pgn_stmt = pg_insert(GamePgn)
+        pgn_stmt = pgn_stmt.on_conflict_do_update(
+            index_elements=[GamePgn.game_id],
+            set_={"data": pgn_stmt.excluded.data, "raw_size": pgn_stmt.excluded.raw_size},
+        )
+        await session.execute(pgn_stmt, pgn_rows)
+    if not imported and len(pgn_rows) < len(ids):
+        # A replaced archive game keeps no PGN Lichess didn't send
+        without_pgn = [id_ for game_id, id_ in ids.items() if game_id not in pgns]
+        await session.execute(delete(GamePgn).where(GamePgn.game_id.in_(without_pgn)))
+
+    missing = [row["game_id"] for row in rows if row["game_id"] not in ids]
+    if missing:
+        ids.update(await get_game_ids(session, missing))
+    return ids
+
+
+async def link_user_games(session: AsyncSession, links: List[Dict]) -> List[int]:
+    """Add games to users' histories, skipping existing links. Returns game pks newly linked."""
+    if not links:
+        return []
+    stmt = (
+        pg_insert(UserGame)
+        .on_conflict_do_nothing(constraint="uq_user_games_user_id_game_id")
+        .returning(UserGame.game_id)
+    )
+    result = await session.execute(stmt, links)
+    return list(result.scalars().all())
+
+
+def encode_games_cursor(played_at: Optional[datetime], user_game_id: int) -> str:
+    """Opaque keyset cursor pointing right after a row in list_games order."""
+    raw = json.dumps([played_at.isoformat() if played_at else None, user_game_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_games_cursor(cursor: str) -> tuple[Optional[datetime], int]:
+    """Decode a cursor from encode_games_cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        played_at, game_id = json.loads(raw)
+        return datetime.fromisoformat(played_at) if played_at is not None else None, int(game_id)
+    except (binascii.Error, TypeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+# Newest first; undated games (e.g. from PGN archives) last
+GAMES_ORDER = (UserGame.played_at.desc().nulls_last(), UserGame.id.desc())
+
+
+# Game columns that list endpoints may return (PGN is fetched separately)
+GAME_LIST_FIELDS = (
+    "id", "game_id", "white", "black", "result", "opening", "eco", "time_class", "played_at",
+    "color", "outcome", "opponent", "my_rating", "rating_diff", "opponent_rating", "rated",
+)
+# Fields served from the user's user_games row rather than the shared game
+_USER_GAME_FIELDS = {
+    "played_at",
+    "time_class",
+    "color",
+    "outcome",
+    "opponent",
+    "my_rating",
+    "rating_diff",
+    "opponent_rating",
+    "rated",
+}
+_OPENING_FIELDS = {"opening": Opening.name, "eco": Opening.eco}
+
+
+def _game_list_column(field: str):
+    if field in _OPENING_FIELDS:
+        return _OPENING_FIELDS[field].label(field)
+    return getattr(UserGame if field in _USER_GAME_FIELDS else Game, field).label(field)
+
+
+def _game_filters(
     user_id: int,
-    page: int = 1,
-    per_page: int = 20,
     opening: Optional[str] = None,
     result: Optional[str] = None,
     time_class: Optional[str] = None,
-) -> Dict:
-    """List games with pagination and filtering."""
-    filters = [Game.user_id == user_id]
-    
+    outcome: Optional[str] = None,
+) -> List:
+    # Only games the user played (outcome is NULL otherwise), like the counters behind `total`
+    filters = [UserGame.user_id == user_id, UserGame.outcome.isnot(None)]
     if opening:
-        filters.append(Game.opening.ilike(f"%{opening}%"))
+        filters.append(Game.opening_id.in_(select(Opening.id).where(Opening.name.ilike(f"%{opening}%"))))
     if result:
         filters.append(Game.result == result)
     if time_class:
-        filters.append(Game.time_class == time_class)
+        filters.append(UserGame.time_class == time_class)
+    if outcome:
+        filters.append(UserGame.outcome == outcome)
+    return filters
+
+
+async def list_games(
+    session: AsyncSession,
+    user_id: int,
+    page: int = 1,
+    per_page: int = 20,
+    opening: Optional[str] = None,
+    result: Optional[str] = None,
+    time_class: Optional[str] = None,
+    outcome: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = "exact",
+    fields: Sequence[str] = GAME_LIST_FIELDS,
+) -> Dict:
+    """List games with pagination and filtering.
+
+    With `cursor` (the `next_cursor` of a previous page) the page is fetched by
+    keyset on (played_at, id) instead of OFFSET, so its cost doesn't depend on depth.
 
-    # Get games
-    query = select(Game).where(and_(*filters)).order_by(Game.played_at.desc())
-    query = query.limit(per_page).offset((page - 1) * per_page)
+    `count` selects how `total` is computed: "exact", "estimated" (planner
+    estimate) or "none" (total is None). Without an opening filter the total
+    is always exact and comes from the user_game_stats counters.
+
+    Only `fields` (plus the cursor columns) are loaded from the database. Rows
+    are returned with one attribute per field.
+    """
+    filters = _game_filters(user_id, opening, result, time_class, outcome)
+
+    # Get games (one extra row tells whether there is a next page)
+    columns = [_game_list_column(field) for field in fields]
+    query = (
+        select(
+            UserGame.id.label("_cursor_id"), UserGame.played_at.label("_cursor_played_at"), *columns
+        )
+        .join(Game, Game.id == UserGame.game_id)
+        .where(and_(*filters))
+        .order_by(*GAMES_ORDER)
+    )
+    if _OPENING_FIELDS.keys() & set(fields):
+        query = query.outerjoin(Opening, Opening.id == Game.opening_id)
+    if cursor:
+        after_played_at, after_id = decode_games_cursor(cursor)
+        if after_played_at is None:
+            query = query.where(UserGame.played_at.is_(None), UserGame.id < after_id)
+        else:
+            query = query.where(
+                or_(
+                    tuple_(UserGame.played_at, UserGame.id)
+                    < tuple_(literal(after_played_at), literal(after_id)),
+                    UserGame.played_at.is_(None),
+                )
+            )
+    else:
+        query = query.offset((page - 1) * per_page)
+    query = query.limit(per_page + 1)
     result_query = await session.execute(query)
-    games = result_query.scalars().all()
+    games = list(result_query.all())
+
+    next_cursor = None
+    if len(games) > per_page:
+        games = games[:per_page]
+        next_cursor = encode_games_cursor(games[-1]._cursor_played_at, games[-1]._cursor_id)
 
     # Get total count
-    count_query = select(func.count()).select_from(Game).where(and_(*filters))
-    count_result = await session.execute(count_query)
-    total = count_result.scalar() or 0
+    total: Optional[int] = None
+    if count == "none":
+        pass
+    elif not opening:
+        total = await count_games_from_stats(
+            session, user_id, result=result, time_class=time_class, outcome=outcome
+        )
+    elif count == "estimated":
+        total = await _estimate_rows(
+            session,
+            select(UserGame.id).join(Game, Game.id == UserGame.game_id).where(and_(*filters)),
+        )
+    else:
+        count_query = (
+            select(func.count())
+            .select_from(UserGame)
+            .join(Game, Game.id == UserGame.game_id)
+            .where(and_(*filters))
+        )
+        count_result = await session.execute(count_query)
+        total = count_result.scalar() or 0
 
-    logger.info(f"Retrieved {len(games)} games for user_id={user_id} (total={total}, page={page})")
+    logger.info(
+        f"Retrieved {len(games)} games for user_id={user_id} "
+        f"(total={total}, page={page}, cursor={cursor})"
+    )
     return {
         "games": games,
         "total": total,
         "page": page,
         "per_page": per_page,
+        "next_cursor": next_cursor,
     }
 
 
-async def get_game_stats(session: AsyncSession, user_id: int) -> Dict:
-    """Get game statistics for user."""
-    # Total games
-    total_query = select(func.count()).select_from(Game).where(Game.user_id == user_id)
-    total_result = await session.execute(total_query)
-    total_games = total_result.scalar() or 0
-    
-    # Wins, losses, draws
-    wins_query = select(func.count()).select_from(Game).where(
-        Game.user_id == user_id, Game.result == "1-0"
+EXPORT_BATCH_SIZE = 1000
+
+
+async def stream_games_for_export(
+    session: AsyncSession,
+    user_id: int,
+    opening: Optional[str] = None,
+    result: Optional[str] = None,
+    time_class: Optional[str] = None,
+    outcome: Optional[str] = None,
+    with_pgn: bool = False,
+) -> AsyncIterator:
+    """Yield the user's games (list_games filters and order) from a server-side cursor.
+
+    Rows carry every GAME_LIST_FIELDS field, plus `pgn` if `with_pgn`. Only
+    EXPORT_BATCH_SIZE rows are held in memory at a time.
+    """
+    columns = [_game_list_column(field) for field in GAME_LIST_FIELDS]
+    query = (
+        select(*columns)
+        .join(Game, Game.id == UserGame.game_id)
+        .outerjoin(Opening, Opening.id == Game.opening_id)
+        .where(and_(*_game_filters(user_id, opening, result, time_class, outcome)))
+        .order_by(*GAMES_ORDER)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
     )
-    wins_result = await session.execute(wins_query)
-    wins = wins_result.scalar() or 0
-    
-    losses_query = select(func.count()).select_from(Game).where(
-        Game.user_id == user_id, Game.result == "0-1"
+    if with_pgn:
+        query = query.add_columns(GamePgn.pgn.label("pgn")).outerjoin(
+            GamePgn, GamePgn.game_id == Game.id
+        )
+
+    stream = await session.stream(query)
+    async for row in stream:
+        yield row
+
+
+async def get_game_pgn(session: AsyncSession, user_id: int, game_id: str) -> Optional[str]:
+    """PGN of one of the user's games ("" if it has none), or None if the user has no such game."""
+    result = await session.execute(
+        select(Game.id, GamePgn.pgn)
+        .join(UserGame, UserGame.game_id == Game.id)
+        .outerjoin(GamePgn, GamePgn.game_id == Game.id)
+        .where(UserGame.user_id == user_id, Game.game_id == game_id)
     )
-    losses_result = await session.execute(losses_query)
-    losses = losses_result.scalar() or 0
-    
-    draws_query = select(func.count()).select_from(Game).where(
-        Game.user_id == user_id, Game.result == "1/2-1/2"
+    row = result.first()
+    if row is None:
+        return None
+    return row.pgn or ""
+
+
+async def pgn_storage_report(session: AsyncSession) -> Dict:
+    """Raw vs stored size of all PGNs in game_pgn."""
+    result = await session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(GamePgn.raw_size), 0),
+            func.coalesce(func.sum(func.octet_length(GamePgn.pgn, type_=Integer)), 0),
+        )
     )
-    draws_result = await session.execute(draws_query)
-    draws = draws_result.scalar() or 0
-    
+    games, raw_bytes, stored_bytes = result.one()
     return {
-        "total": total_games,
-        "wins": wins,
-        "losses": losses,
-        "draws": draws,
+        "games": games,
+        "raw_bytes": int(raw_bytes),
+        "stored_bytes": int(stored_bytes),
+        "saved_bytes": int(raw_bytes) - int(stored_bytes),
+        "ratio": round(int(stored_bytes) / int(raw_bytes), 3) if raw_bytes else None,
     }
 
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of a statement, keeping its bound parameters."""
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def _estimate_rows(session: AsyncSession, query) -> int:
+    """Planner row estimate for `query` (EXPLAIN, nothing is executed)."""
+    result = await session.execute(_Explain(query))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+# result (White's point of view) -> (color, outcome) combinations it covers
+RESULT_PERSPECTIVES = {
+    "1-0": [("white", "win"), ("black", "loss")],
+    "0-1": [("white", "loss"), ("black", "win")],
+    "1/2-1/2": [("white", "draw"), ("black", "draw")],
+}
+
+
+async def count_games_from_stats(
+    session: AsyncSession,
+    user_id: int,
+    result: Optional[str] = None,
+    time_class: Optional[str] = None,
+    outcome: Optional[str] = None,
+) -> int:
+    """Count the user's games by result, time class and/or outcome from the maintained counters."""
+    query = select(func.coalesce(func.sum(UserGameStats.games), 0)).where(
+        UserGameStats.user_id == user_id
+    )
+    if time_class:
+        query = query.where(UserGameStats.time_class == time_class)
+    if outcome:
+        query = query.where(UserGameStats.outcome == outcome)
+    if result:
+        perspectives = RESULT_PERSPECTIVES.get(result)
+        if not perspectives:
+            return 0
+        query = query.where(tuple_(UserGameStats.color, UserGameStats.outcome).in_(perspectives))
+    count_result = await session.execute(query)
+    return int(count_result.scalar() or 0)
+
+
+async def suggest_openings(
+    session: AsyncSession,
+    user_id: int,
+    q: str,
+    limit: int = 10,
+) -> List[Dict]:
+    """Openings of the user's games matching `q`, best match first, with game counts.
+
+    Matches substrings and near misses (trigram word similarity); both are
+    served by the opening trigram GIN index. Counts come from the opening
+    rollup, so the user's games themselves are not scanned.
+    """
+    score = func.word_similarity(q, Opening.name)
+    games = func.sum(UserOpeningStats.games)
+    query = (
+        select(Opening.name, Opening.eco, games, score.label("score"))
+        .join(UserOpeningStats, UserOpeningStats.opening_id == Opening.id)
+        .where(
+            UserOpeningStats.user_id == user_id,
+            or_(Opening.name.icontains(q, autoescape=True), Opening.name.op("%>")(q)),
+        )
+        .group_by(Opening.id)
+        .order_by(score.desc(), games.desc())
+        .limit(limit)
+    )
+    result = await session.execute(query)
+    return [
+        {"opening": opening, "eco": eco, "games": int(count), "score": round(score, 3)}
+        for opening, eco, count, score in result.all()
+    ]
+
+
+async def increment_game_stats(
+    session: AsyncSession,
+    user_id: int,
+    counts: Dict[tuple[str, str, str], int],
+) -> None:
+    """Add newly ingested games to the user's counters.
+
+    `counts` maps (time_class, color, outcome) to a number of games. Runs in the
+    caller's transaction, together with the insert of those games.
+    """
+    if not counts:
+        return
+
+    stmt = pg_insert(UserGameStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            UserGameStats.user_id,
+            UserGameStats.time_class,
+            UserGameStats.color,
+            UserGameStats.outcome,
+        ],
+        set_={"games": UserGameStats.games + stmt.excluded.games},
+    )
+    await session.execute(
+        stmt,
+        [
+            {
+                "user_id": user_id,
+                "time_class": time_class,
+                "color": color,
+                "outcome": outcome,
+                "games": games,
+            }
+            for (time_class, color, outcome), games in counts.items()
+        ],
+    )
+
+
+async def rebuild_game_stats(session: AsyncSession, user_id: int) -> None:
+    """Recompute the user's counters from their games."""
+    aggregated = (
+        select(
+            UserGame.user_id, UserGame.time_class, UserGame.color, UserGame.outcome, func.count()
+        )
+        .where(UserGame.user_id == user_id, UserGame.color.isnot(None))
+        .group_by(UserGame.user_id, UserGame.time_class, UserGame.color, UserGame.outcome)
+    )
+
+    await session.execute(delete(UserGameStats).where(UserGameStats.user_id == user_id))
+    await session.execute(
+        pg_insert(UserGameStats).from_select(
+            ["user_id", "time_class", "color", "outcome", "games"], aggregated
+        )
+    )
+
+
+async def has_games_in_time_class(session: AsyncSession, user_id: int, time_class: str) -> bool:
+    """Whether the user has played any game of `time_class` (from the stats counters)."""
+    result = await session.execute(
+        select(UserGameStats.games)
+        .where(
+            UserGameStats.user_id == user_id,
+            UserGameStats.time_class == time_class,
+            UserGameStats.games > 0,
+        )
+        .limit(1)
+    )
+    return result.first() is not None
+
+
+async def get_game_stats(session: AsyncSession, user_id: int) -> Dict:
+    """Get game statistics for user from the maintained counters."""
+    result = await session.execute(
+        select(
+            UserGameStats.time_class,
+            UserGameStats.color,
+            UserGameStats.outcome,
+            UserGameStats.games,
+        ).where(UserGameStats.user_id == user_id)
+    )
+
+    totals = {"total": 0, "wins": 0, "losses": 0, "draws": 0}
+    by_time_class: Dict[str, Dict[str, int]] = {}
+    by_color: Dict[str, Dict[str, int]] = {}
+    outcome_key = {"win": "wins", "loss": "losses", "draw": "draws"}
+    for time_class, color, outcome, games in result.all():
+        for bucket in (
+            totals,
+            by_time_class.setdefault(time_class, {"total": 0, "wins": 0, "losses": 0, "draws": 0}),
+            by_color.setdefault(color, {"total": 0, "wins": 0, "losses": 0, "draws": 0}),
+        ):
+            bucket["total"] += games
+            bucket[outcome_key[outcome]] += games
+
+    return {
+        **totals,
+        "by_time_class": by_time_class,
+        "by_color": by_color,
+    }
+
+
+OPENING_STATS_COUNTERS = (
+    "games",
+    "wins",
+    "draws",
+    "losses",
+    "opponent_rating_sum",
+    "rated_opponents",
+)
+
+
+async def increment_opening_stats(
+    session: AsyncSession,
+    user_id: int,
+    counts: Mapping[tuple[int, str, str, date], Mapping[str, int]],
+) -> None:
+    """Add newly ingested games to the user's opening rollup.
+
+    `counts` maps (opening_id, color, time_class, month) to increments of the
+    OPENING_STATS_COUNTERS. Runs in the caller's transaction.
+    """
+    if not counts:
+        return
+
+    stmt = pg_insert(UserOpeningStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            UserOpeningStats.user_id,
+            UserOpeningStats.opening_id,
+            UserOpeningStats.color,
+            UserOpeningStats.time_class,
+            UserOpeningStats.month,
+        ],
+        set_={
+            counter: getattr(UserOpeningStats, counter) + getattr(stmt.excluded, counter)
+            for counter in OPENING_STATS_COUNTERS
+        },
+    )
+    await session.execute(
+        stmt,
+        [
+            {
+                "user_id": user_id,
+                "opening_id": opening_id,
+                "color": color,
+                "time_class": time_class,
+                "month": month,
+                **{counter: increments.get(counter, 0) for counter in OPENING_STATS_COUNTERS},
+            }
+            for (opening_id, color, time_class, month), increments in sorted(counts.items())
+        ],
+    )
+
+
+async def rebuild_opening_stats(session: AsyncSession, user_id: int) -> None:
+    """Recompute the user's opening rollup from their games."""
+    # Literals rather than bind parameters, so GROUP BY matches the select list
+    month = func.date_trunc(
+        literal_column("'month'"), func.timezone(literal_column("'UTC'"), UserGame.played_at)
+    ).cast(Date)
+    aggregated = (
+        select(
+            UserGame.user_id,
+            Game.opening_id,
+            UserGame.color,
+            UserGame.time_class,
+            month,
+            func.count(),
+            func.count().filter(UserGame.outcome == "win"),
+            func.count().filter(UserGame.outcome == "draw"),
+            func.count().filter(UserGame.outcome == "loss"),
+            func.coalesce(func.sum(UserGame.opponent_rating), 0),
+            func.count(UserGame.opponent_rating),
+        )
+        .join(Game, Game.id == UserGame.game_id)
+        .where(
+            UserGame.user_id == user_id,
+            UserGame.color.isnot(None),
+            UserGame.played_at.isnot(None),
+            Game.opening_id.isnot(None),
+        )
+        .group_by(UserGame.user_id, Game.opening_id, UserGame.color, UserGame.time_class, month)
+    )
+
+    await session.execute(delete(UserOpeningStats).where(UserOpeningStats.user_id == user_id))
+    await session.execute(
+        pg_insert(UserOpeningStats).from_select(
+            ["user_id", "opening_id", "color", "time_class", "month", *OPENING_STATS_COUNTERS],
+            aggregated,
+        )
+    )
+
+
+async def get_opening_stats(
+    session: AsyncSession,
+    user_id: int,
+    time_class: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> List[Dict]:
+    """Per opening and color results from the rollup, most played first.
+
+    `since` / `until` select whole months: the months containing them are included.
+    """
+    games = func.sum(UserOpeningStats.games)
+    rated_opponents = func.sum(UserOpeningStats.rated_opponents)
+    query = (
+        select(
+            Opening.name,
+            Opening.eco,
+            UserOpeningStats.color,
+            games,
+            func.sum(UserOpeningStats.wins),
+            func.sum(UserOpeningStats.draws),
+            func.sum(UserOpeningStats.losses),
+            func.sum(UserOpeningStats.opponent_rating_sum) / func.nullif(rated_opponents, 0),
+        )
+        .join(Opening, Opening.id == UserOpeningStats.opening_id)
+        .where(UserOpeningStats.user_id == user_id)
+        .group_by(Opening.id, UserOpeningStats.color)
+        .order_by(games.desc(), Opening.name, UserOpeningStats.color)
+    )
+    if time_class:
+        query = query.where(UserOpeningStats.time_class == time_class)
+    if since:
+        query = query.where(UserOpeningStats.month >= since.replace(day=1))
+    if until:
+        query = query.where(UserOpeningStats.month <= until.replace(day=1))
+
+    result = await session.execute(query)
+    return [
+        {
+            "opening": opening,
+            "eco": eco,
+            "color": color,
+            "games": int(games),
+            "wins": int(wins),
+            "draws": int(draws),
+            "losses": int(losses),
+            "avg_opponent_rating": round(avg_rating) if avg_rating is not None else None,
+        }
+        for opening, eco, color, games, wins, draws, losses, avg_rating in result.all()
+    ]
+
+
+async def get_rating_history(
+    session: AsyncSession,
+    user_id: int,
+    time_class: str,
+) -> List[tuple[datetime, int]]:
+    """(played_at, rating after game) of the user's rated games in a time class, oldest first."""
+    rating = UserGame.my_rating + func.coalesce(UserGame.rating_diff, 0)
+    result = await session.execute(
+        select(UserGame.played_at, rating)
+        .where(
+            UserGame.user_id == user_id,
+            UserGame.time_class == time_class,
+            UserGame.played_at.isnot(None),
+            UserGame.my_rating.isnot(None),
+            UserGame.rated.isnot(False),
+        )
+        .order_by(UserGame.played_at)
+    )
+    return [(played_at, rating) for played_at, rating in result.all()]
+
+
+# Sync state operations
+
+async def get_sync_state(session: AsyncSession, user_id: int) -> Optional[SyncState]:
+    """Get sync state for user."""
+    result = await session.execute(select(SyncState).where(SyncState.user_id == user_id))
+    return result.scalars().first()
+
+
+async def advance_sync_watermark(
+    session: AsyncSession,
+    user_id: int,
+    last_game_at: int,
+    last_game_id: str,
+) -> None:
+    """Move the user's sync watermark forward (never backwards).
+
+    Runs in the caller's transaction, so the watermark is committed together
+    with the games it covers.
+    """
+    stmt = pg_insert(SyncState).values(
+        user_id=user_id,
+        last_game_at=last_game_at,
+        last_game_id=last_game_id,
+        updated_at=datetime.now(timezone.utc),
+    )
+    is_newer = stmt.excluded.last_game_at > func.coalesce(SyncState.last_game_at, 0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SyncState.user_id],
+        set_={
+            "last_game_at": case(
+                (is_newer, stmt.excluded.last_game_at), else_=SyncState.last_game_at
+            ),
+            "last_game_id": case(
+                (is_newer, stmt.excluded.last_game_id), else_=SyncState.last_game_id
+            ),
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await session.execute(stmt)
+
+
+async def _upsert_sync_state(session: AsyncSession, user_id: int, **values) -> None:
+    values["updated_at"] = datetime.now(timezone.utc)
+    stmt = pg_insert(SyncState).values(user_id=user_id, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SyncState.user_id],
+        set_={key: getattr(stmt.excluded, key) for key in values},
+    )
+    await session.execute(stmt)
+
+
+async def start_backfill(session: AsyncSession, user_id: int, total: Optional[int] = None) -> None:
+    """Mark the user's backfill as running, keeping any checkpoint from an interrupted attempt."""
+    state = await get_sync_state(session, user_id)
+    values: Dict[str, Any] = {"backfill_status": "running", "backfill_error": None}
+    if total is not None:
+        values["backfill_total"] = total
+    if not state or not state.backfill_started_at:
+        values["backfill_started_at"] = datetime.now(timezone.utc)
+    await _upsert_sync_state(session, user_id, **values)
+
+
+async def create_backfill_windows(
+    session: AsyncSession,
+    user_id: int,
+    windows: Sequence[tuple[int, int]],
+) -> List[int]:
+    """Replace the user's backfill windows with new (since, until) slices. Returns their ids."""
+    await session.execute(delete(BackfillWindow).where(BackfillWindow.user_id == user_id))
+    result = await session.execute(
+        pg_insert(BackfillWindow).returning(BackfillWindow.id, sort_by_parameter_order=True),
+        [
+            {"user_id": user_id, "since": since, "until": until, "status": "pending"}
+            for since, until in windows
+        ],
+    )
+    return list(result.scalars().all())
+
+
+async def get_backfill_windows(session: AsyncSession, user_id: int) -> List[BackfillWindow]:
+    """The user's backfill windows, newest first."""
+    result = await session.execute(
+        select(BackfillWindow)
+        .where(BackfillWindow.user_id == user_id)
+        .order_by(BackfillWindow.until.desc())
+    )
+    return list(result.scalars().all())
+
+
+async def get_backfill_window(session: AsyncSession, window_id: int) -> Optional[BackfillWindow]:
+    return await session.get(BackfillWindow, window_id)
+
+
+async def set_backfill_window_status(
+    session: AsyncSession,
+    window_id: int,
+    status: str,
+    error: Optional[str] = None,
+) -> None:
+    await session.execute(
+        update(BackfillWindow)
+        .where(BackfillWindow.id == window_id)
+        .values(status=status, error=error, updated_at=datetime.now(timezone.utc))
+    )
+
+
+async def claim_backfill_window(
+    session: AsyncSession, window_id: int, stale_before: datetime, task_id: Optional[str] = None
+) -> bool:
+    """Mark a window as running for `task_id` unless another task is already on it.
+
+    A `running` window claimed by the same task (redelivered after its worker
+    died) or whose `updated_at` is older than `stale_before` can be claimed again.
+    """
+    reclaimable = [BackfillWindow.updated_at.is_(None), BackfillWindow.updated_at < stale_before]
+    if task_id is not None:
+        reclaimable.append(BackfillWindow.claimed_by == task_id)
+    result = await session.execute(
+        update(BackfillWindow)
+        .where(
+            BackfillWindow.id == window_id,
+            or_(
+                BackfillWindow.status.in_(("pending", "failed")),
+                and_(BackfillWindow.status == "running", or_(*reclaimable)),
+            ),
+        )
+        .values(
+            status="running",
+            claimed_by=task_id,
+            error=None,
+            updated_at=datetime.now(timezone.utc),
+        )
+        .returning(BackfillWindow.id)
+    )
+    return result.scalar() is not None
+
+
+async def count_unfinished_backfill_windows(session: AsyncSession, user_id: int) -> int:
+    result = await session.execute(
+        select(func.count())
+        .select_from(BackfillWindow)
+        .where(BackfillWindow.user_id == user_id, BackfillWindow.status != "done")
+    )
+    return int(result.scalar() or 0)
+
+
+async def advance_backfill_checkpoint(
+    session: AsyncSession,
+    window_id: int,
+    user_id: int,
+    until: int,
+    games: int,
+) -> None:
+    """Record that the window is saved from `until` (Lichess createdAt, ms) up to its end.
+
+    Runs in the caller's transaction, together with the batch of `games` it covers.
+    """
+    now = datetime.now(timezone.utc)
+    await session.execute(
+        update(BackfillWindow)
+        .where(BackfillWindow.id == window_id)
+        .values(
+            checkpoint=func.least(func.coalesce(BackfillWindow.checkpoint, until), until),
+            games=BackfillWindow.games + games,
+            updated_at=now,
+        )
+    )
+    await session.execute(
+        update(SyncState)
+        .where(SyncState.user_id == user_id)
+        .values(backfill_games=SyncState.backfill_games + games, updated_at=now)
+    )
+
+
+async def finish_backfill(session: AsyncSession, user_id: int, error: Optional[str] = None) -> None:
+    """Mark the user's backfill as done, or as failed with `error`."""
+    await _upsert_sync_state(
+        session,
+        user_id,
+        backfill_status="failed" if error else "done",
+        backfill_error=error,
+        backfill_finished_at=datetime.now(timezone.utc),
+    )
+
+
+async def list_stalled_backfill_user_ids(
+    session: AsyncSession, failed_before: datetime, stale_before: datetime
+) -> List[int]:
+    """Users whose backfill failed before `failed_before`, or is running without progress.
+
+    A running backfill is stuck when it made no progress since `stale_before`.
+    """
+    result = await session.execute(
+        select(SyncState.user_id).where(
+            or_(
+                and_(
+                    SyncState.backfill_status == "failed",
+                    SyncState.backfill_finished_at < failed_before,
+                ),
+                and_(SyncState.backfill_status == "running", SyncState.updated_at < stale_before),
+            )
+        )
+    )
+    return list(result.scalars().all())
+
+
+async def list_due_user_ids(session: AsyncSession) -> List[int]:
+    """Users whose next periodic sync is due, never-scheduled then longest overdue first."""
+    result = await session.execute(
+        select(User.id)
+        .outerjoin(SyncState, SyncState.user_id == User.id)
+        .where(or_(SyncState.next_sync_at.is_(None), SyncState.next_sync_at <= func.now()))
+        .order_by(SyncState.next_sync_at.asc().nulls_first(), User.id)
+    )
+    return list(result.scalars().all())
+
+
+async def schedule_sync(
+    session: AsyncSession,
+    user_id: int,
+    interval: int,
+    delay: Optional[int] = None,
+) -> None:
+    """Set the user's periodic sync interval (seconds).
+
+    The next sync is due after `delay` seconds, or after the interval by default.
+    """
+    await _upsert_sync_state(
+        session,
+        user_id,
+        sync_interval=interval,
+        next_sync_at=datetime.now(timezone.utc)
+        + timedelta(seconds=interval if delay is None else delay),
+    )
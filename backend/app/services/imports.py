@@ -0,0 +1,175 @@
+"""Background import of PGN archives uploaded by users.
+
+The API spools the upload to `settings.import_dir`; a Celery task streams it
+through the PGN reader and saves games in large batches with the same code
+path as the Lichess sync. Job progress lives in a Redis hash.
+"""
+import logging
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, cast
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.db import AsyncSessionLocal
+from app.core.redis import get_redis
+from app.models.models import User
+from app.services import crud, sync
+from app.services.pgn import read_games, to_lichess_game
+
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+IMPORT_JOB_KEY = "import:job:{job_id}"
+IMPORT_JOB_TTL = 24 * 60 * 60
+IMPORT_BATCH_SIZE = 2000
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+_COUNTERS = (
+    "user_id",
+    "bytes_total",
+    "bytes_read",
+    "games_read",
+    "games_imported",
+    "games_skipped",
+)
+
+
+def import_path(job_id: str) -> Path:
+    return Path(settings.import_dir) / f"{job_id}.pgn"
+
+
+def spool_upload(source: IO[bytes], job_id: str) -> int:
+    """Copy an upload to the import directory in chunks. Returns its size.
+
+    Raises ValueError if it is larger than `settings.import_max_bytes`.
+    """
+    path = import_path(job_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    size = 0
+    try:
+        with open(path, "wb") as target:
+            while chunk := source.read(SPOOL_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.import_max_bytes:
+                    raise ValueError(f"Archive is larger than {settings.import_max_bytes} bytes")
+                target.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return size
+
+
+async def _update_job(job_id: str, **fields: Any) -> None:
+    redis = get_redis()
+    key = IMPORT_JOB_KEY.format(job_id=job_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(
+            key, mapping={field: "" if value is None else value for field, value in fields.items()}
+        )
+        pipe.expire(key, IMPORT_JOB_TTL)
+        await pipe.execute()
+
+
+async def create_job(job_id: str, user_id: int, player: Optional[str], size: int) -> None:
+    await _update_job(
+        job_id,
+        status="queued",
+        user_id=user_id,
+        player=player,
+        bytes_total=size,
+        bytes_read=0,
+        games_read=0,
+        games_imported=0,
+        games_skipped=0,
+        created_at=time.time(),
+    )
+
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Status and progress of an import job, or None if unknown or expired."""
+    data = await get_redis().hgetall(IMPORT_JOB_KEY.format(job_id=job_id))
+    if not data:
+        return None
+    # The client decodes responses, so fields are str
+    job: Dict[str, Any] = {"job_id": job_id, **cast(Dict[str, str], data)}
+    for field in _COUNTERS:
+        job[field] = int(job.get(field) or 0)
+    for field in ("created_at", "started_at", "finished_at"):
+        job[field] = float(job[field]) if job.get(field) else None
+    job["player"] = job.get("player") or None
+    job["error"] = job.get("error") or None
+    return job
+
+
+async def _save_batch(
+    session: AsyncSession,
+    user: User,
+    batch: List[Dict[str, Any]],
+    player: Optional[str],
+) -> int:
+    imported = await sync.save_games(session, user, batch, player=player, imported=True)
+    await session.commit()
+    return imported
+
+
+async def run_import(job_id: str) -> Dict[str, Any]:
+    """Import a spooled archive into the job owner's games."""
+    job = await get_job(job_id)
+    if not job:
+        return {"error": "Import job not found"}
+
+    path = import_path(job_id)
+    games_read = games_imported = 0
+    started_at = time.time()
+    await _update_job(job_id, status="running", started_at=started_at)
+    try:
+        async with AsyncSessionLocal() as session:
+            user = await crud.get_user_by_id(session, job["user_id"])
+            if not user:
+                raise ValueError("User not found")
+
+            # Blocking reads are fine: the import is the only job on this worker's loop
+            with open(path, "rb") as archive:  # noqa: ASYNC230
+                batch: List[Dict[str, Any]] = []
+                for tags, text in read_games(archive):
+                    batch.append(to_lichess_game(tags, text))
+                    if len(batch) < IMPORT_BATCH_SIZE:
+                        continue
+                    games_imported += await _save_batch(session, user, batch, job["player"])
+                    games_read += len(batch)
+                    batch = []
+                    await _update_job(
+                        job_id,
+                        bytes_read=archive.tell(),
+                        games_read=games_read,
+                        games_imported=games_imported,
+                        games_skipped=games_read - games_imported,
+                    )
+                if batch:
+                    games_imported += await _save_batch(session, user, batch, job["player"])
+                    games_read += len(batch)
+    except Exception as exc:
+        logger.error(f"import: Job {job_id} failed after {games_read} games: {exc!r}")
+        await _update_job(job_id, status="failed", error=str(exc), finished_at=time.time())
+        return {"job_id": job_id, "error": str(exc)}
+    finally:
+        path.unlink(missing_ok=True)
+
+    elapsed = time.time() - started_at
+    await _update_job(
+        job_id,
+        status="done",
+        bytes_read=job["bytes_total"],
+        games_read=games_read,
+        games_imported=games_imported,
+        games_skipped=games_read - games_imported,
+        finished_at=time.time(),
+    )
+    logger.info(
+        f"import: Job {job_id} imported {games_imported} of {games_read} games "
+        f"in {elapsed:.1f}s ({games_read / max(elapsed, 1e-3):.0f} games/s)"
+    )
+    return {"job_id": job_id, "games_read": games_read, "games_imported": games_imported}
@@ -1,15 +1,19 @@
+import asyncio
 import base64
 import hashlib
 import json
 import logging
+import random
 import secrets
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
 import httpx
 
 from app.core.config import get_settings
+from app.core.redis import get_redis
 from app.schemas.schemas import TokenPayload
+from app.services import rate_limit
 
 
 logger = logging.getLogger(__name__)
@@ -20,6 +24,207 @@ TOKEN_URL = f"{LICHESS_BASE}/api/token"
 ACCOUNT_URL = f"{LICHESS_BASE}/api/account"
 GAMES_URL_TEMPLATE = f"{LICHESS_BASE}/api/games/user/{{username}}"
 
+# Process-wide client: keeps TCP/TLS connections to lichess.org alive between calls
+_client: Optional[httpx.AsyncClient] = None
+
+
+def init_client() -> httpx.AsyncClient:
+    """Create the shared Lichess client (no-op if it is already open)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.lichess_timeout, connect=settings.lichess_connect_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.lichess_max_connections,
+                max_keepalive_connections=settings.lichess_max_keepalive_connections,
+                keepalive_expiry=settings.lichess_keepalive_expiry,
+            ),
+            http2=settings.lichess_http2,
+        )
+        logger.info(f"Lichess HTTP client initialized (http2={settings.lichess_http2})")
+    return _client
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared Lichess client, creating it lazily outside managed lifecycles."""
+    return init_client()
+
+
+async def close_client() -> None:
+    """Close the shared Lichess client and its connection pool."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# Failure state shared by every process, so one worker's 429 throttles everyone
+COOLDOWN_KEY = "lichess:cooldown"
+BREAKER_FAILURES_KEY = "lichess:breaker:failures"
+BREAKER_OPEN_KEY = "lichess:breaker:open"
+RETRY_BUDGET_KEY = "ratelimit:lichess:retries"
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LichessUnavailableError(Exception):
+    """Lichess calls are paused (circuit breaker or 429 cool-down) for `retry_after` seconds."""
+
+    def __init__(self, retry_after: float, reason: str = "circuit breaker is open"):
+        super().__init__(f"Lichess is unavailable ({reason}), retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+async def circuit_open_for() -> float:
+    """Seconds until the circuit breaker closes again (0 if it is closed)."""
+    return max(0, await get_redis().pttl(BREAKER_OPEN_KEY)) / 1000
+
+
+async def get_status() -> Dict[str, Any]:
+    """Shared failure state of the Lichess client, for monitoring."""
+    redis = get_redis()
+    cooldown_ms, failures = await asyncio.gather(
+        redis.pttl(COOLDOWN_KEY), redis.get(BREAKER_FAILURES_KEY)
+    )
+    return {
+        "circuit_open_for": await circuit_open_for(),
+        "cooldown_for": max(0, cooldown_ms) / 1000,
+        "recent_failures": int(failures or 0),
+    }
+
+
+async def _wait_for_cooldown() -> None:
+    while (remaining_ms := await get_redis().pttl(COOLDOWN_KEY)) > 0:
+        logger.info(f"Lichess cool-down: waiting {remaining_ms}ms")
+        await asyncio.sleep(remaining_ms / 1000)
+
+
+async def _start_cooldown(resp: httpx.Response) -> None:
+    try:
+        seconds = float(resp.headers.get("Retry-After", settings.lichess_cooldown))
+    except ValueError:
+        seconds = settings.lichess_cooldown
+    logger.warning(f"Lichess returned 429: pausing all Lichess calls for {seconds:.0f}s")
+    await get_redis().set(COOLDOWN_KEY, 1, px=int(seconds * 1000), nx=True)
+
+
+async def _unavailable_error(resp: Optional[httpx.Response]) -> LichessUnavailableError:
+    """Error for a failed interactive call: retry after the cool-down on a 429, otherwise
+    once the circuit breaker closes, or after the longest backoff while it is closed."""
+    if resp is not None and resp.status_code == 429:
+        cooldown_ms = await get_redis().pttl(COOLDOWN_KEY)
+        retry_after = cooldown_ms / 1000 if cooldown_ms > 0 else settings.lichess_cooldown
+        return LichessUnavailableError(retry_after, reason="rate limited")
+    reason = "network error" if resp is None else f"HTTP {resp.status_code}"
+    return LichessUnavailableError(
+        await circuit_open_for() or settings.lichess_backoff_max, reason=reason
+    )
+
+
+async def _record_failure() -> None:
+    """Count a failure in the current breaker window; successes don't reset it, so
+    the breaker also opens when only part of many concurrent requests fail."""
+    redis = get_redis()
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.incr(BREAKER_FAILURES_KEY)
+        pipe.pexpire(BREAKER_FAILURES_KEY, int(settings.lichess_breaker_window * 1000), nx=True)
+        failures, _ = await pipe.execute()
+    if failures >= settings.lichess_breaker_threshold:
+        opened = await redis.set(
+            BREAKER_OPEN_KEY, 1, px=int(settings.lichess_breaker_open * 1000), nx=True
+        )
+        if opened:
+            await redis.delete(BREAKER_FAILURES_KEY)
+            logger.error(
+                f"Lichess circuit breaker opened after {failures} failures: "
+                f"pausing Lichess calls for {settings.lichess_breaker_open:.0f}s"
+            )
+
+
+async def _request(
+    method: str,
+    url: str,
+    stream: bool = False,
+    interactive: bool = False,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Send a request to Lichess through the shared rate limit and failure handling.
+
+    - A 429 pauses every process for the mandated cool-down, then is retried.
+    - 5xx and network errors are retried with full-jitter exponential backoff,
+      as long as the shared retry budget allows. Only GETs are retried: a
+      token POST is single-use, so other methods are retried only if the
+      connection failed before anything was sent.
+    - Sustained failures open a circuit breaker: calls then fail fast with
+      LichessUnavailableError until it closes.
+
+    `interactive` calls serve a waiting user: they are not retried and raise
+    LichessUnavailableError during a cool-down, on a 429, 5xx or network error,
+    instead of sleeping.
+
+    Returns a successful response; with `stream` its body is not read yet and
+    the caller must close it. Raises httpx errors once retries are exhausted.
+    """
+    client = get_client()
+    attempt = 0
+    while True:
+        if open_for := await circuit_open_for():
+            raise LichessUnavailableError(open_for)
+        if interactive:
+            if (cooldown_ms := await get_redis().pttl(COOLDOWN_KEY)) > 0:
+                raise LichessUnavailableError(cooldown_ms / 1000, reason="rate limited")
+        else:
+            await _wait_for_cooldown()
+        await rate_limit.acquire()
+
+        error: Optional[Exception] = None
+        resp: Optional[httpx.Response] = None
+        try:
+            resp = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        except httpx.TransportError as exc:
+            error = exc
+        else:
+            if resp.status_code not in RETRYABLE_STATUS:
+                if stream and not resp.is_success:
+                    await resp.aread()
+                    await resp.aclose()
+                resp.raise_for_status()
+                return resp
+            if resp.status_code == 429:
+                await _start_cooldown(resp)
+            else:
+                await _record_failure()
+            await resp.aclose()
+
+        if error is not None:
+            await _record_failure()
+
+        attempt += 1
+        retryable = method == "GET" or isinstance(error, httpx.ConnectError)
+        can_retry = (
+            retryable
+            and not interactive
+            and attempt <= settings.lichess_max_retries
+            and await rate_limit.try_acquire(
+                RETRY_BUDGET_KEY, settings.lichess_retry_budget, settings.lichess_retry_burst
+            )
+        )
+        if not can_retry:
+            if interactive:
+                raise await _unavailable_error(resp) from error
+            if error is not None:
+                raise error
+            assert resp is not None
+            resp.raise_for_status()
+
+        backoff = min(settings.lichess_backoff_max, settings.lichess_backoff_base * 2 ** attempt)
+        delay = random.uniform(0, backoff)
+        reason = repr(error) if resp is None else f"HTTP {resp.status_code}"
+        logger.warning(f"Lichess {method} {url} failed ({reason}), retry {attempt} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
 
 def generate_pkce() -> tuple[str, str]:
     """Generate PKCE code_verifier and code_challenge."""
@@ -38,10 +243,8 @@ async def exchange_code(code: str, code_verifier: str) -> TokenPayload:
         "redirect_uri": str(settings.lichess_redirect_uri),
         "code_verifier": code_verifier,
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(TOKEN_URL, data=data)
-        resp.raise_for_status()
-        payload = resp.json()
+    resp = await _request("POST", TOKEN_URL, interactive=True, data=data)
+    payload = resp.json()
     expires_in = payload.get("expires_in")
     return TokenPayload(
         access_token=payload["access_token"],
@@ -57,10 +260,8 @@ async def refresh_access_token(refresh_token_value: str) -> TokenPayload:
         "grant_type": "refresh_token",
         "refresh_token": refresh_token_value,
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(TOKEN_URL, data=data)
-        resp.raise_for_status()
-        payload = resp.json()
+    resp = await _request("POST", TOKEN_URL, interactive=True, data=data)
+    payload = resp.json()
     return TokenPayload(
         access_token=payload["access_token"],
         token_type=payload.get("token_type", "Bearer"),
@@ -70,64 +271,76 @@ async def refresh_access_token(refresh_token_value: str) -> TokenPayload:
     )
 
 
-async def get_account(access_token: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(ACCOUNT_URL, headers={"Authorization": f"Bearer {access_token}"})
-        resp.raise_for_status()
-        return resp.json()
+async def get_account(access_token: str, interactive: bool = False) -> Dict[str, Any]:
+    resp = await _request(
+        "GET",
+        ACCOUNT_URL,
+        interactive=interactive,
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    return resp.json()
 
 
-async def get_games(
+async def stream_games(
     username: str,
     access_token: str,
-    max_games: int = 50,
+    max_games: Optional[int] = None,
     perf_type: Optional[str] = None,
     since: Optional[int] = None,
     until: Optional[int] = None,
-) -> List[Dict[str, Any]]:
-    """Fetch games from Lichess API. Returns a list of game objects.
-    
+    sort: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Stream games from Lichess API, yielding each game as soon as it arrives.
+
     Args:
         username: Lichess username
         access_token: OAuth access token
-        max_games: Maximum number of games to fetch
+        max_games: Maximum number of games to fetch (None for the whole history)
         perf_type: Filter by game type (bullet, blitz, rapid, etc.)
         since: Fetch games played after this timestamp (ms)
         until: Fetch games played before this timestamp (ms)
-    
-    Note: Lichess API returns NDJSON (newline-delimited JSON), not a JSON array.
+        sort: "dateDesc" (Lichess default, newest first) or "dateAsc"
+
+    Lichess sends NDJSON (one JSON object per line). Lines are decoded one by
+    one, so memory stays constant regardless of history size.
     """
     params: Dict[str, Any] = {
-        "max": max_games,
         "pgnInJson": "true",
         "opening": "true",
     }
+    if max_games:
+        params["max"] = max_games
     if perf_type:
         params["perfType"] = perf_type
     if since:
         params["since"] = since
     if until:
         params["until"] = until
-    
-    logger.info(f"Fetching games for {username}: max={max_games}, since={since}, until={until}")
-    
+    if sort:
+        params["sort"] = sort
+
+    logger.info(f"Streaming games for {username}: max={max_games}, since={since}, until={until}")
+
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/x-ndjson",
     }
-    
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.get(
-            GAMES_URL_TEMPLATE.format(username=username),
-            params=params,
-            headers=headers,
-        )
-        resp.raise_for_status()
-        
-        # Parse NDJSON (one JSON object per line)
-        games = []
-        for line in resp.text.strip().split("\n"):
-            if line:
-                games.append(json.loads(line))
-        logger.info(f"Fetched {len(games)} games for {username}")
-        return games
+
+    count = 0
+    resp = await _request(
+        "GET",
+        GAMES_URL_TEMPLATE.format(username=username),
+        stream=True,
+        params=params,
+        headers=headers,
+    )
+    try:
+        async for line in resp.aiter_lines():
+            if not line.strip():
+                continue
+            count += 1
+            yield json.loads(line)
+    finally:
+        await resp.aclose()
+
+    logger.info(f"Streamed {count} games for {username}")
@@ -0,0 +1,71 @@
+"""Operational metrics, aggregated in Redis across all API and Celery processes."""
+from typing import Any, Dict, List
+
+from app.core.redis import get_redis
+
+
+SYNC_RUN_KEY = "metrics:sync:run:{run_id}"
+SYNC_RUNS_KEY = "metrics:sync:runs"
+SYNC_RUNS_KEPT = 20
+SYNC_RUN_TTL = 24 * 60 * 60
+
+PROFILE_CACHE_KEY = "metrics:profile_cache"
+
+_SET_MAX_LUA = """
+local current = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if tonumber(ARGV[2]) > current then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+"""
+
+
+async def start_sync_run(run_id: str, started_at: float, users_enqueued: int) -> None:
+    redis = get_redis()
+    key = SYNC_RUN_KEY.format(run_id=run_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, mapping={"started_at": started_at, "users_enqueued": users_enqueued})
+        pipe.expire(key, SYNC_RUN_TTL)
+        pipe.lpush(SYNC_RUNS_KEY, run_id)
+        pipe.ltrim(SYNC_RUNS_KEY, 0, SYNC_RUNS_KEPT - 1)
+        await pipe.execute()
+
+
+async def record_user_sync(run_id: str, status: str, queue_lag_ms: int, games: int = 0) -> None:
+    """Record the outcome of one user's sync in a run.
+
+    `status` is one of "synced", "skipped" or "failed".
+    """
+    redis = get_redis()
+    key = SYNC_RUN_KEY.format(run_id=run_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hincrby(key, f"users_{status}", 1)
+        pipe.hincrby(key, "games_synced", games)
+        pipe.hincrby(key, "queue_lag_ms_sum", queue_lag_ms)
+        await pipe.execute()
+    await redis.eval(_SET_MAX_LUA, 1, key, "queue_lag_ms_max", queue_lag_ms)
+
+
+async def recent_sync_runs(limit: int = SYNC_RUNS_KEPT) -> List[Dict[str, Any]]:
+    """Metrics of the most recent sync runs, newest first."""
+    redis = get_redis()
+    run_ids = await redis.lrange(SYNC_RUNS_KEY, 0, limit - 1)
+    runs = []
+    for run_id in run_ids:
+        data = await redis.hgetall(SYNC_RUN_KEY.format(run_id=run_id))
+        if not data:
+            continue
+        run: Dict[str, Any] = {"run_id": run_id, "started_at": float(data.pop("started_at", 0))}
+        run.update({str(field): int(value) for field, value in data.items()})
+        processed = sum(run.get(f"users_{s}", 0) for s in ("synced", "skipped", "failed"))
+        run["queue_lag_ms_avg"] = run.get("queue_lag_ms_sum", 0) // processed if processed else 0
+        runs.append(run)
+    return runs
+
+
+async def incr_counter(key: str, field: str, amount: int = 1) -> None:
+    await get_redis().hincrby(key, field, amount)
+
+
+async def get_counters(key: str) -> Dict[str, int]:
+    data = await get_redis().hgetall(key)
+    return {str(field): int(value) for field, value in data.items()}
@@ -0,0 +1,141 @@
+"""Streaming PGN reader: turns a PGN archive into games shaped like the Lichess API's."""
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import IO, Any, Dict, Iterator, Optional, Tuple
+
+
+_TAG = re.compile(r'^\[([A-Za-z0-9_]+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+_LICHESS_SITE = re.compile(r"^https?://lichess\.org/([A-Za-z0-9]{8})")
+_SPEEDS = {"ultrabullet": "ultraBullet", "bullet": "bullet", "blitz": "blitz", "rapid": "rapid",
+           "classical": "classical", "correspondence": "correspondence"}
+_WINNERS = {"1-0": "white", "0-1": "black"}
+_ECO = re.compile(r"^[A-E]\d\d$")
+
+
+def read_games(stream: IO[bytes]) -> Iterator[Tuple[Dict[str, str], str]]:
+    """Yield (tags, PGN text) for each game of a binary PGN stream, one game in memory at a time.
+
+    Movetext wrapped at 80 columns may start a line with `[`, e.g. a `[%clk ...]`
+    command inside a `{...}` comment. A line only starts the next game's headers
+    outside a comment, and when it is a complete tag pair or follows a blank line.
+    """
+    tags: Dict[str, str] = {}
+    lines: list[str] = []
+    in_moves = False
+    in_comment = False
+    after_blank = False
+    for raw in stream:
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        match = _TAG.match(line) if line.startswith("[") else None
+        if in_moves and not in_comment and (match or (after_blank and line.startswith("["))):
+            yield tags, "\n".join(lines).strip()
+            tags, lines, in_moves = {}, [], False
+        if in_moves:
+            in_comment = _ends_in_comment(line, in_comment)
+        elif match:
+            tags[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+        elif line.strip() and tags and not line.startswith("["):
+            in_moves = True
+            in_comment = _ends_in_comment(line, False)
+        after_blank = not line.strip()
+        if tags:
+            lines.append(line)
+    if tags:
+        yield tags, "\n".join(lines).strip()
+
+
+def _ends_in_comment(line: str, in_comment: bool) -> bool:
+    """Whether a movetext line leaves a `{...}` comment open (`;` comments run to end of line)."""
+    for char in line:
+        if in_comment:
+            in_comment = char != "}"
+        elif char == "{":
+            in_comment = True
+        elif char == ";":
+            break
+    return in_comment
+
+
+def _game_id(tags: Dict[str, str], pgn: str) -> str:
+    """Lichess id for Lichess games, otherwise a stable id derived from the game itself."""
+    match = _LICHESS_SITE.match(tags.get("Site", ""))
+    if match:
+        return match.group(1)
+    source = tags.get("Link") or pgn
+    return "pgn-" + hashlib.sha1(source.encode()).hexdigest()[:24]
+
+
+def _speed(tags: Dict[str, str]) -> str:
+    """Lichess speed from the Event name, else estimated from TimeControl like Lichess does."""
+    for word in tags.get("Event", "").lower().split():
+        if word in _SPEEDS:
+            return _SPEEDS[word]
+    time_control = tags.get("TimeControl", "")
+    if time_control == "-":
+        return "correspondence"
+    base, _, increment = time_control.partition("+")
+    if not base.isdigit():
+        return "Unknown"
+    estimate = int(base) + 40 * int(increment or 0) if (increment or "0").isdigit() else int(base)
+    if estimate < 30:
+        return "ultraBullet"
+    if estimate < 180:
+        return "bullet"
+    if estimate < 480:
+        return "blitz"
+    if estimate < 1500:
+        return "rapid"
+    return "classical"
+
+
+def _created_at(tags: Dict[str, str]) -> Optional[int]:
+    """Start time in ms since the epoch, as in Lichess' createdAt."""
+    date = tags.get("UTCDate") or tags.get("Date") or ""
+    time = tags.get("UTCTime") or tags.get("Time") or "00:00:00"
+    try:
+        played_at = datetime.strptime(f"{date} {time}", "%Y.%m.%d %H:%M:%S").replace(
+            tzinfo=timezone.utc
+        )
+    except ValueError:
+        return None
+    return int(played_at.timestamp() * 1000)
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def to_lichess_game(tags: Dict[str, str], pgn: str) -> Dict[str, Any]:
+    """A game from a PGN archive in the shape of a Lichess API game object (see sync.game_row)."""
+    players = {}
+    for side in ("white", "black"):
+        prefix = side.capitalize()
+        name = (tags.get(prefix) or "Unknown")[:64]
+        players[side] = {
+            "user": {"name": name, "id": name.lower()},
+            "rating": _int(tags.get(f"{prefix}Elo")),
+            "ratingDiff": _int(tags.get(f"{prefix}RatingDiff")),
+        }
+
+    event = tags.get("Event", "").lower()
+    game: Dict[str, Any] = {
+        "id": _game_id(tags, pgn),
+        "players": players,
+        "speed": _speed(tags),
+        "createdAt": _created_at(tags),
+        "rated": (
+            True if event.startswith("rated") else False if event.startswith("casual") else None
+        ),
+        "opening": {
+            "name": (tags.get("Opening") or "Unknown")[:255],
+            "eco": tags["ECO"] if _ECO.match(tags.get("ECO", "")) else None,
+        },
+        "pgn": pgn,
+    }
+    if winner := _WINNERS.get(tags.get("Result", "")):
+        game["winner"] = winner
+    return game
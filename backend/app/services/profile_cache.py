@@ -0,0 +1,112 @@
+"""Redis cache of Lichess account data with stale-while-revalidate.
+
+Fresh entries (younger than `profile_cache_ttl`) are served directly. Older
+entries are served as-is while a background refresh runs, until they expire
+after a further `profile_cache_stale_ttl`. Refreshes are single-flight: one
+in-flight fetch per user inside a process, and a Redis lock across processes.
+The access token is only loaded when Lichess is actually called.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.redis import get_redis
+from app.services import metrics, rate_limit
+from app.services.lichess import get_account
+
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PROFILE_KEY = "cache:profile:{user_id}"
+LOCK_KEY = "cache:profile:{user_id}:lock"
+LOCK_TIMEOUT = 10  # seconds; how long to wait for a peer's fetch
+PEER_POLL_INTERVAL = 0.1
+
+# user_id -> in-flight refresh of this process
+_inflight: Dict[int, "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
+
+# Loads the user's access token; may run after the request that passed it has returned
+TokenLoader = Callable[[], Awaitable[str]]
+
+
+async def get_profile(user_id: int, load_token: TokenLoader) -> Dict[str, Any]:
+    """Get the user's Lichess account data, from cache when possible."""
+    cached = await get_redis().get(PROFILE_KEY.format(user_id=user_id))
+    if cached:
+        entry = json.loads(cached)
+        if time.time() - entry["fetched_at"] < settings.profile_cache_ttl:
+            await metrics.incr_counter(metrics.PROFILE_CACHE_KEY, "hits")
+            return entry["data"]
+
+        await metrics.incr_counter(metrics.PROFILE_CACHE_KEY, "stale_hits")
+        _refresh(user_id, load_token, wait_for_peer=False)
+        return entry["data"]
+
+    await metrics.incr_counter(metrics.PROFILE_CACHE_KEY, "misses")
+    # Shield: a cancelled request must not cancel a refresh other requests wait on
+    data = await asyncio.shield(_refresh(user_id, load_token, wait_for_peer=True))
+    if data is None:
+        # Joined a background refresh that deferred to another process
+        data = await _fetch_and_store(user_id, load_token, wait_for_peer=True)
+    assert data is not None  # with wait_for_peer the fetch never defers
+    return data
+
+
+async def invalidate(user_id: int) -> None:
+    """Drop the user's entry, e.g. after a sync stored new games or a new login."""
+    await get_redis().delete(PROFILE_KEY.format(user_id=user_id))
+
+
+def _refresh(
+    user_id: int, load_token: TokenLoader, wait_for_peer: bool
+) -> "asyncio.Task[Optional[Dict[str, Any]]]":
+    """Start a refresh for the user, or join the one already in flight."""
+    task = _inflight.get(user_id)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_store(user_id, load_token, wait_for_peer))
+        _inflight[user_id] = task
+        task.add_done_callback(lambda t: _on_refresh_done(user_id, t))
+    return task
+
+
+def _on_refresh_done(user_id: int, task: "asyncio.Task[Optional[Dict[str, Any]]]") -> None:
+    _inflight.pop(user_id, None)
+    if not task.cancelled() and task.exception():
+        logger.warning(f"Profile refresh failed for user_id={user_id}: {task.exception()!r}")
+
+
+async def _fetch_and_store(
+    user_id: int, load_token: TokenLoader, wait_for_peer: bool
+) -> Optional[Dict[str, Any]]:
+    redis = get_redis()
+    key = PROFILE_KEY.format(user_id=user_id)
+
+    # Token-checked lease: an expired lock taken over by another process is never deleted by us
+    async with rate_limit.lease(LOCK_KEY.format(user_id=user_id)) as locked:
+        if not locked:
+            if not wait_for_peer:
+                return None  # another process is already refreshing this entry
+            # Another process is fetching: wait for it to fill the cache
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(PEER_POLL_INTERVAL)
+                cached = await redis.get(key)
+                if cached:
+                    return json.loads(cached)["data"]
+            logger.warning(
+                f"Profile refresh by peer timed out for user_id={user_id}, fetching directly"
+            )
+
+        data = await get_account(await load_token(), interactive=True)
+        entry = {"fetched_at": time.time(), "data": data}
+        await redis.set(
+            key,
+            json.dumps(entry),
+            ex=settings.profile_cache_ttl + settings.profile_cache_stale_ttl,
+        )
+        await metrics.incr_counter(metrics.PROFILE_CACHE_KEY, "upstream_fetches")
+        return data
@@ -0,0 +1,183 @@
+"""Distributed rate limits and leases shared by every API and worker process through Redis."""
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.core.config import get_settings
+from app.core.redis import get_redis
+
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+LICHESS_BUCKET = "ratelimit:lichess"
+
+# Refills the bucket from the elapsed Redis server time, then takes `requested`
+# tokens if available. Returns 0 on success, otherwise milliseconds to wait.
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = math.ceil((requested - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+
+async def acquire(
+    key: str = LICHESS_BUCKET,
+    rate: float | None = None,
+    capacity: int | None = None,
+    tokens: int = 1,
+) -> None:
+    """Block until `tokens` can be taken from the bucket.
+
+    Defaults to the Lichess budget: `lichess_rate_limit` requests per second
+    with bursts of up to `lichess_rate_burst`.
+    """
+    rate = rate or settings.lichess_rate_limit
+    capacity = capacity or settings.lichess_rate_burst
+    script = get_redis().register_script(_TOKEN_BUCKET_LUA)
+    while True:
+        wait_ms = int(await script(keys=[key], args=[rate, capacity, tokens]))
+        if wait_ms <= 0:
+            return
+        logger.debug(f"Rate limit {key}: waiting {wait_ms}ms")
+        await asyncio.sleep(wait_ms / 1000)
+
+
+async def try_acquire(key: str, rate: float, capacity: int, tokens: int = 1) -> bool:
+    """Take `tokens` from the bucket if available right now, without waiting."""
+    script = get_redis().register_script(_TOKEN_BUCKET_LUA)
+    return int(await script(keys=[key], args=[rate, capacity, tokens])) <= 0
+
+
+LICHESS_STREAMS = "ratelimit:lichess:streams"
+
+# Counting semaphore: a sorted set of holders scored by lease expiry. Expired
+# leases (crashed holders) are dropped first. Returns 1 if a slot was taken.
+_SLOT_ACQUIRE_LUA = """
+local limit = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], ttl)
+    return 1
+end
+return 0
+"""
+
+_SLOT_REFRESH_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZADD', KEYS[1], 'XX', now + tonumber(ARGV[1]), ARGV[2])
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[1]))
+"""
+
+SLOT_TTL_MS = 60_000
+SLOT_POLL_INTERVAL = 1.0
+
+
+@asynccontextmanager
+async def slot(
+    key: str = LICHESS_STREAMS, limit: int | None = None, wait: bool = True
+) -> AsyncIterator[bool]:
+    """Hold one of `limit` slots shared by all processes (defaults to concurrent Lichess streams).
+
+    Yields whether a slot was taken: with `wait` it polls until one is free,
+    otherwise it yields False right away when all are busy. The lease is
+    renewed in the background while held and expires on its own if the
+    holder dies.
+    """
+    limit = limit or settings.lichess_max_streams
+    redis = get_redis()
+    holder = uuid.uuid4().hex
+    acquire_script = redis.register_script(_SLOT_ACQUIRE_LUA)
+    while not int(await acquire_script(keys=[key], args=[limit, SLOT_TTL_MS, holder])):
+        if not wait:
+            yield False
+            return
+        await asyncio.sleep(SLOT_POLL_INTERVAL)
+
+    async def keep_alive() -> None:
+        refresh_script = redis.register_script(_SLOT_REFRESH_LUA)
+        while True:
+            await asyncio.sleep(SLOT_TTL_MS / 3000)
+            await refresh_script(keys=[key], args=[SLOT_TTL_MS, holder])
+
+    renewer = asyncio.create_task(keep_alive())
+    try:
+        yield True
+    finally:
+        renewer.cancel()
+        await redis.zrem(key, holder)
+
+
+# Exclusive lease: a key holding the holder's token. Only the holder may renew or
+# release it, so a lease that expired and was taken over is never deleted by its old holder.
+_LEASE_REFRESH_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_LEASE_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+LEASE_TTL_MS = 60_000
+
+
+@asynccontextmanager
+async def lease(key: str, wait: float = 0) -> AsyncIterator[bool]:
+    """Hold an exclusive lease on `key` across all processes.
+
+    Yields whether it was acquired, after polling for up to `wait` seconds; if
+    not, someone else holds it and the caller should skip its work. Like
+    `slot`, the lease is renewed while held and expires if the holder dies.
+    """
+    redis = get_redis()
+    holder = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not await redis.set(key, holder, px=LEASE_TTL_MS, nx=True):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        await asyncio.sleep(SLOT_POLL_INTERVAL)
+
+    async def keep_alive() -> None:
+        refresh_script = redis.register_script(_LEASE_REFRESH_LUA)
+        while True:
+            await asyncio.sleep(LEASE_TTL_MS / 3000)
+            await refresh_script(keys=[key], args=[holder, LEASE_TTL_MS])
+
+    renewer = asyncio.create_task(keep_alive())
+    try:
+        yield True
+    finally:
+        renewer.cancel()
+        await redis.register_script(_LEASE_RELEASE_LUA)(keys=[key], args=[holder])
@@ -0,0 +1,568 @@
+"""Async game sync engine.
+
+Runs on the Celery worker's persistent event loop (see `celery_app.run_async`),
+so many users can be synced concurrently inside one worker process.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.db import AsyncSessionLocal
+from app.models.models import User
+from app.services import crud, metrics, profile_cache, rate_limit
+from app.services.lichess import (
+    RETRYABLE_STATUS,
+    LichessUnavailableError,
+    circuit_open_for,
+    get_account,
+    stream_games,
+)
+
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Games are saved and committed in chunks of this size while a stream is consumed
+SYNC_BATCH_SIZE = 500
+
+# At most one sync of a user (periodic or backfill planning) runs at a time, across all workers
+USER_SYNC_LEASE = "sync:lease:user:{user_id}"
+BACKFILL_LEASE_WAIT = 60.0
+# A running backfill window not checkpointed for this long (seconds) lost its task
+BACKFILL_WINDOW_STALE = 600
+# A failed backfill is resumed from its checkpoints after this many seconds (or on the next login)
+BACKFILL_RESUME_AFTER = 60 * 60
+
+
+def _played_at(game: Dict[str, Any]) -> Optional[datetime]:
+    if created_at := game.get("createdAt"):
+        return datetime.fromtimestamp(created_at / 1000, tz=timezone.utc)
+    return None
+
+
+def game_opening(game: Dict[str, Any]) -> tuple[str, Optional[str]]:
+    """(name, ECO code) of a Lichess game's opening."""
+    opening = game.get("opening", {})
+    return opening.get("name", "Unknown"), opening.get("eco")
+
+
+OUTCOME_COUNTERS = {"win": "wins", "draw": "draws", "loss": "losses"}
+
+# Opening name -> id. Openings are never deleted, so entries never go stale.
+_opening_ids: Dict[str, int] = {}
+
+
+async def get_opening_ids(openings: Dict[str, Optional[str]]) -> Dict[str, int]:
+    """Ids of the given openings (name -> ECO code), creating unknown ones.
+
+    Only names missing from the in-process cache reach the database. New
+    openings are committed in their own short transaction, so a cached id
+    never points at a row that was rolled back with a failed batch.
+    """
+    missing = {name: eco for name, eco in openings.items() if name not in _opening_ids}
+    if missing:
+        async with AsyncSessionLocal() as session:
+            _opening_ids.update(await crud.upsert_openings(session, missing))
+            await session.commit()
+    return {name: _opening_ids[name] for name in openings}
+
+
+def game_row(game: Dict[str, Any], opening_ids: Dict[str, int]) -> Dict[str, Any]:
+    """Convert a Lichess game object (which must have an id) into a shared `games` row."""
+    game_id = game["id"]
+    players = game.get("players", {})
+    white = players.get("white", {}).get("user", {}).get("name", "Unknown")
+    black = players.get("black", {}).get("user", {}).get("name", "Unknown")
+
+    winner = game.get("winner")
+    if winner == "white":
+        result = "1-0"
+    elif winner == "black":
+        result = "0-1"
+    else:
+        result = "1/2-1/2"
+
+    return {
+        "game_id": game_id,
+        "white": white,
+        "black": black,
+        "result": result,
+        "opening_id": opening_ids[game_opening(game)[0]],
+        "time_class": game.get("speed", "Unknown"),
+        "played_at": _played_at(game),
+        "pgn": game.get("pgn"),
+    }
+
+
+def game_perspective(
+    user: User,
+    game: Dict[str, Any],
+    player: Optional[str] = None,
+) -> tuple[Optional[str], str]:
+    """Return (color, outcome) of a Lichess game from the user's point of view.
+
+    `player` is the user's name in the game if it isn't their Lichess account
+    (games imported from other sites). Color is None if the user isn't one of
+    the players.
+    """
+    players = game.get("players", {})
+    color = None
+    for side in ("white", "black"):
+        account = players.get(side, {}).get("user", {})
+        name = (account.get("name") or "").lower()
+        if player is not None:
+            matches = name == player.lower()
+        else:
+            matches = account.get("id") == user.lichess_id or name == user.username.lower()
+        if matches:
+            color = side
+            break
+
+    winner = game.get("winner")
+    if not winner:
+        outcome = "draw"
+    elif winner == color:
+        outcome = "win"
+    else:
+        outcome = "loss"
+    return color, outcome
+
+
+def user_game_row(user: User, game: Dict[str, Any], player: Optional[str] = None) -> Dict[str, Any]:
+    """The user's `user_games` columns for a Lichess game (without the game's primary key)."""
+    color, outcome = game_perspective(user, game, player)
+    players = game.get("players", {})
+    me = players.get(color, {}) if color else {}
+    them = players.get("black" if color == "white" else "white", {}) if color else {}
+    opponent = them.get("user", {}).get("name")
+    if not opponent and them.get("aiLevel"):
+        opponent = f"Stockfish level {them['aiLevel']}"
+    return {
+        "user_id": user.id,
+        "played_at": _played_at(game),
+        "time_class": game.get("speed", "Unknown"),
+        "color": color,
+        "outcome": outcome if color else None,
+        "opponent": opponent or ("Unknown" if color else None),
+        "my_rating": me.get("rating"),
+        "rating_diff": me.get("ratingDiff"),
+        "opponent_rating": them.get("rating"),
+        "rated": game.get("rated"),
+    }
+
+
+async def save_games(
+    session: AsyncSession,
+    user: User,
+    games_data: List[Dict[str, Any]],
+    player: Optional[str] = None,
+    imported: bool = False,
+) -> int:
+    """Save a batch of Lichess games and update the user's stats. Returns count of new games.
+
+    Games already stored for another user (the opponent, say) are only linked
+    to this user, not parsed and written again. Games the user didn't play
+    (e.g. the rest of an imported archive) are skipped. See game_perspective
+    for `player`. Games from an uploaded archive are `imported`: they don't
+    overwrite stored games, and games fetched from Lichess overwrite them.
+    """
+    user_rows = {}
+    for game in games_data:
+        if game.get("id"):
+            row = user_game_row(user, game, player)
+            if row["color"]:
+                user_rows[game["id"]] = row
+    games = {game["id"]: game for game in games_data if game.get("id") in user_rows}
+    if not games:
+        return 0
+
+    game_ids = await crud.get_game_ids(session, list(games), include_imported=imported)
+    opening_ids = await get_opening_ids(dict(game_opening(game) for game in games.values()))
+    rows = [
+        game_row(game, opening_ids)
+        for lichess_id, game in games.items()
+        if lichess_id not in game_ids
+    ]
+    game_ids.update(await crud.insert_games(session, rows, imported=imported))
+
+    links = {
+        game_ids[lichess_id]: {**user_rows[lichess_id], "game_id": game_ids[lichess_id]}
+        for lichess_id in games
+    }
+    openings = {
+        game_ids[lichess_id]: opening_ids[game_opening(game)[0]]
+        for lichess_id, game in games.items()
+    }
+    new_links = await crud.link_user_games(session, list(links.values()))
+
+    stats: Counter = Counter()
+    opening_stats: Dict[tuple[int, str, str, date], Counter] = {}
+    for game_pk in new_links:
+        link = links[game_pk]
+        stats[(link["time_class"], link["color"], link["outcome"])] += 1
+        if link["played_at"]:
+            month = link["played_at"].date().replace(day=1)
+            counters = opening_stats.setdefault(
+                (openings[game_pk], link["color"], link["time_class"], month), Counter()
+            )
+            counters["games"] += 1
+            counters[OUTCOME_COUNTERS[link["outcome"]]] += 1
+            if link["opponent_rating"] is not None:
+                counters["opponent_rating_sum"] += link["opponent_rating"]
+                counters["rated_opponents"] += 1
+    await crud.increment_game_stats(session, user.id, stats)
+    await crud.increment_opening_stats(session, user.id, opening_stats)
+
+    return len(new_links)
+
+
+async def _save_batch(
+    session: AsyncSession,
+    user: User,
+    batch: List[Dict[str, Any]],
+    backfill_window: Optional[int] = None,
+) -> int:
+    """Save a batch and advance the user's watermark (and backfill checkpoint) atomically."""
+    games_count = await save_games(session, user, batch)
+    dated = [game for game in batch if game.get("createdAt") and game.get("id")]
+    if dated:
+        newest = max(dated, key=lambda game: game["createdAt"])
+        await crud.advance_sync_watermark(session, user.id, newest["createdAt"], newest["id"])
+        if backfill_window is not None:
+            oldest = min(game["createdAt"] for game in dated)
+            await crud.advance_backfill_checkpoint(
+                session, backfill_window, user.id, oldest, len(batch)
+            )
+    await session.commit()
+    return games_count
+
+
+async def _sync_stream(
+    session: AsyncSession,
+    user: User,
+    backfill_window: Optional[int] = None,
+    **stream_kwargs,
+) -> int:
+    """Consume a Lichess game stream incrementally, committing every SYNC_BATCH_SIZE games.
+
+    With `backfill_window` (a newest-first stream) every committed batch also
+    moves that window's checkpoint. Returns count of new games.
+    """
+    total_synced = 0
+    batch = []
+    async for game in stream_games(user.username, user.access_token, **stream_kwargs):
+        batch.append(game)
+        if len(batch) < SYNC_BATCH_SIZE:
+            continue
+        total_synced += await _save_batch(session, user, batch, backfill_window)
+        logger.info(
+            f"sync: Saved batch of {len(batch)} games for user {user.username} "
+            f"(new: {total_synced})"
+        )
+        batch = []
+
+    if batch:
+        total_synced += await _save_batch(session, user, batch, backfill_window)
+
+    return total_synced
+
+
+def split_history(created_at: int, now: int, total_games: Optional[int]) -> List[tuple[int, int]]:
+    """Cut [created_at, now] (ms, inclusive) into equal time windows of about
+    `backfill_window_games` games each, newest first.
+    """
+    count = math.ceil((total_games or 0) / settings.backfill_window_games)
+    count = max(1, min(count, settings.backfill_max_windows, now - created_at + 1))
+    step = (now - created_at + 1) / count
+    bounds = [created_at + round(step * i) for i in range(count)] + [now + 1]
+    return [(bounds[i], bounds[i + 1] - 1) for i in reversed(range(count))]
+
+
+async def start_history_backfill(user_id: int) -> List[int]:
+    """Plan the user's full-history backfill. Returns ids of the windows left to sync.
+
+    The account's lifetime (Lichess createdAt up to now) is split into time
+    windows, each synced by its own task. A backfill interrupted earlier is
+    resumed: its unfinished windows are returned as they are. Planning waits
+    for a periodic sync of the same user to finish first.
+    """
+    async with rate_limit.lease(
+        USER_SYNC_LEASE.format(user_id=user_id), wait=BACKFILL_LEASE_WAIT
+    ) as acquired:
+        if not acquired:
+            raise RuntimeError(f"Another sync of user_id={user_id} is still running")
+        return await _plan_history_backfill(user_id)
+
+
+async def _plan_history_backfill(user_id: int) -> List[int]:
+    async with AsyncSessionLocal() as session:
+        user = await crud.get_user_by_id(session, user_id)
+        if not user:
+            return []
+
+        state = await crud.get_sync_state(session, user_id)
+        if state and state.backfill_status == "done":
+            return []
+
+        windows = await crud.get_backfill_windows(session, user_id)
+        if windows:
+            # Windows still running (or queued) keep their task; the rest are enqueued again
+            stale_before = datetime.now(timezone.utc) - timedelta(seconds=BACKFILL_WINDOW_STALE)
+            pending = [
+                window.id
+                for window in windows
+                if window.status in ("pending", "failed")
+                or (
+                    window.status == "running"
+                    and (not window.updated_at or window.updated_at < stale_before)
+                )
+            ]
+            for window_id in pending:
+                await crud.set_backfill_window_status(session, window_id, "pending")
+            await crud.start_backfill(session, user_id)
+            await session.commit()
+            logger.info(
+                f"sync_all: Resuming backfill for {user.username}: "
+                f"{len(pending)} windows to enqueue"
+            )
+            return pending
+
+        account = await get_account(user.access_token)
+        total = account.get("count", {}).get("all")
+        now = int(time.time() * 1000)
+        history = split_history(account.get("createdAt") or 0, now, total)
+        await crud.start_backfill(session, user_id, total)
+        window_ids = await crud.create_backfill_windows(session, user_id, history)
+        await session.commit()
+
+    logger.info(
+        f"sync_all: Backfill for {user.username}: {total} games in {len(window_ids)} windows"
+    )
+    return window_ids
+
+
+def backfill_streams() -> int:
+    """Backfill windows streamed at once across all workers: the backfill's share
+    of the Lichess request rate, capped by `lichess_max_streams`."""
+    share = int(settings.lichess_rate_limit * settings.backfill_rate_share)
+    return max(1, min(settings.lichess_max_streams, share))
+
+
+async def sync_history_window(window_id: int, task_id: Optional[str] = None) -> Dict[str, Any]:
+    """Sync one backfill window, newest to oldest, resuming from its checkpoint.
+
+    At most `backfill_streams()` windows stream from Lichess at once across
+    all workers; when none is free the result has `deferred` set and the
+    caller should run it again later instead of waiting. The last window to
+    finish completes the user's backfill. `task_id` identifies the calling
+    task: redelivered after its worker died, it takes its window straight back.
+    """
+    async with AsyncSessionLocal() as session:
+        window = await crud.get_backfill_window(session, window_id)
+        if not window or window.status == "done":
+            return {"window_id": window_id, "games_synced": 0}
+        user = await crud.get_user_by_id(session, window.user_id)
+        if not user:
+            return {"error": "User not found"}
+
+        async with rate_limit.slot(limit=backfill_streams(), wait=False) as acquired:
+            if not acquired:
+                return {"window_id": window_id, "deferred": True}
+            stale_before = datetime.now(timezone.utc) - timedelta(seconds=BACKFILL_WINDOW_STALE)
+            if not await crud.claim_backfill_window(
+                session, window_id, stale_before, task_id
+            ):
+                # A duplicate task: another one is streaming this window
+                return {"window_id": window_id, "games_synced": 0}
+            await session.commit()
+            await session.refresh(window)
+
+            # `until` is inclusive: the checkpoint game is re-read and skipped as a duplicate
+            since, until = window.since, window.checkpoint or window.until
+            try:
+                total_synced = await _sync_stream(
+                    session, user, backfill_window=window_id, since=since, until=until
+                )
+            except Exception:
+                # Release the window for the retry
+                await session.rollback()
+                await crud.set_backfill_window_status(session, window_id, "pending")
+                await session.commit()
+                raise
+
+        await crud.set_backfill_window_status(session, window_id, "done")
+        await session.commit()
+        if not await crud.count_unfinished_backfill_windows(session, user.id):
+            await crud.finish_backfill(session, user.id)
+            await session.commit()
+            await profile_cache.invalidate(user.id)
+            logger.info(f"sync_all: Backfill completed for user {user.username}")
+
+    return {"window_id": window_id, "user_id": user.id, "games_synced": total_synced}
+
+
+async def list_stalled_backfill_user_ids() -> List[int]:
+    """Users whose backfill should be resumed: failed over BACKFILL_RESUME_AFTER ago, or stuck."""
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        return await crud.list_stalled_backfill_user_ids(
+            session,
+            failed_before=now - timedelta(seconds=BACKFILL_RESUME_AFTER),
+            stale_before=now - timedelta(seconds=BACKFILL_WINDOW_STALE),
+        )
+
+
+async def fail_backfill_window(window_id: int, error: str) -> None:
+    """Mark a window, and so its user's backfill, as failed once its task has run out of retries."""
+    async with AsyncSessionLocal() as session:
+        window = await crud.get_backfill_window(session, window_id)
+        if not window:
+            return
+        await crud.set_backfill_window_status(session, window_id, "failed", error)
+        await crud.finish_backfill(session, window.user_id, error=error)
+        await session.commit()
+
+
+async def list_due_user_ids() -> List[int]:
+    async with AsyncSessionLocal() as session:
+        return await crud.list_due_user_ids(session)
+
+
+def next_sync_interval(
+    previous: Optional[int], new_games: int, last_game_at: Optional[int], now: float
+) -> int:
+    """Seconds until the user's next periodic sync.
+
+    New games reset it to `sync_min_interval`. Otherwise it grows by
+    `sync_backoff_factor` per empty sync, but stays under a quarter of the
+    time since the user's last game, so someone who played minutes ago is
+    polled again soon while a months-idle account settles at `sync_max_interval`.
+    """
+    if new_games or previous is None:
+        return settings.sync_min_interval
+    interval = previous * settings.sync_backoff_factor
+    if last_game_at:
+        interval = min(interval, (now - last_game_at / 1000) / 4)
+    return int(min(max(interval, settings.sync_min_interval), settings.sync_max_interval))
+
+
+def is_transient(exc: Exception) -> bool:
+    """Whether a sync failure is a Lichess outage (breaker, network, 429, 5xx), not the user's."""
+    if isinstance(exc, (LichessUnavailableError, httpx.TransportError)):
+        return True
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code in RETRYABLE_STATUS
+
+
+async def _sync_user_recent(user_id: int) -> tuple[str, int]:
+    """Sync games played since the user's watermark and schedule the next sync.
+
+    Returns (status, new games count). Skipped while another sync of the same
+    user holds its lease or the user's history backfill is running.
+    """
+    async with rate_limit.lease(USER_SYNC_LEASE.format(user_id=user_id)) as acquired:
+        if not acquired:
+            return "skipped", 0
+        async with AsyncSessionLocal() as session:
+            user = await crud.get_user_by_id(session, user_id)
+            if not user:
+                return "skipped", 0
+
+            state = await crud.get_sync_state(session, user_id)
+            previous = state.sync_interval if state else None
+            last_game_at = state.last_game_at if state else None
+            if state and state.backfill_status == "running":
+                # The backfill windows are syncing this user; they don't take the
+                # lease (they run in parallel), so stay out until they are done
+                return "skipped", 0
+
+            try:
+                if not last_game_at:
+                    games = await _sync_stream(session, user, max_games=10)
+                else:
+                    # Oldest first, so each committed batch moves the watermark strictly forward
+                    # and an interrupted run resumes without gaps.
+                    games = await _sync_stream(
+                        session, user, since=last_game_at + 1, sort="dateAsc"
+                    )
+                    # `since` is the start time and only finished games are exported: a
+                    # correspondence game started before the watermark can finish much
+                    # later, so look back for those separately (stored games are skipped)
+                    if await crud.has_games_in_time_class(session, user_id, "correspondence"):
+                        since = max(0, last_game_at - settings.sync_correspondence_overlap * 1000)
+                        games += await _sync_stream(
+                            session, user, perf_type="correspondence", since=since, sort="dateAsc"
+                        )
+            except Exception as exc:
+                if is_transient(exc):
+                    # Lichess' trouble, not the user's: keep their schedule
+                    raise
+                # Back off failing users (e.g. revoked tokens) like idle ones
+                await session.rollback()
+                await crud.schedule_sync(
+                    session, user_id, next_sync_interval(previous, 0, last_game_at, time.time())
+                )
+                await session.commit()
+                raise
+
+            await crud.schedule_sync(
+                session, user_id, next_sync_interval(previous, games, last_game_at, time.time())
+            )
+            await session.commit()
+            if games:
+                # New games change the profile's game counts and ratings
+                await profile_cache.invalidate(user_id)
+            return "synced", games
+
+
+async def _sync_user_recent_in_run(
+    user_id: int,
+    run_id: str,
+    enqueued_at: float,
+    semaphore: asyncio.Semaphore,
+) -> tuple[str, int]:
+    async with semaphore:
+        queue_lag_ms = max(0, int((time.time() - enqueued_at) * 1000))
+        if queue_lag_ms > settings.sync_max_queue_lag * 1000:
+            # A newer run has already been scheduled for this user
+            status, games = "skipped", 0
+        elif await circuit_open_for():
+            # Lichess is failing: leave the user to a run after the breaker closes
+            status, games = "skipped", 0
+        else:
+            try:
+                status, games = await _sync_user_recent(user_id)
+            except LichessUnavailableError:
+                status, games = "skipped", 0
+            except Exception as exc:
+                logger.error(f"sync_recent: Failed for user_id={user_id}: {exc!r}")
+                status, games = "failed", 0
+        await metrics.record_user_sync(run_id, status, queue_lag_ms, games)
+        return status, games
+
+
+async def sync_recent_games_batch(
+    user_ids: List[int], run_id: str, enqueued_at: float
+) -> Dict[str, Any]:
+    """Sync recent games for a batch of users, at most `sync_concurrency` users at a time."""
+    semaphore = asyncio.Semaphore(settings.sync_concurrency)
+    results = await asyncio.gather(
+        *(_sync_user_recent_in_run(user_id, run_id, enqueued_at, semaphore) for user_id in user_ids)
+    )
+    summary: Dict[str, Any] = {
+        "run_id": run_id,
+        "users_synced": 0,
+        "users_skipped": 0,
+        "users_failed": 0,
+    }
+    for status, _ in results:
+        summary[f"users_{status}"] += 1
+    summary["games_synced"] = sum(games for _, games in results)
+    return summary
@@ -1,159 +1,117 @@
-import logging
-from datetime import datetime, timezone
+"""Celery entry points. The actual work lives in the async services (app/services/)."""
+import random
+import time
+import uuid
 
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker
-
-from app.services.celery_app import celery_app
 from app.core.config import get_settings
-from app.models.models import Game, User
+from app.services import imports, metrics, sync
+from app.services.celery_app import celery_app, run_async
+from app.services.lichess import LichessUnavailableError
 
-logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Create synchronous engine for Celery tasks
-sync_engine = create_engine(
-    settings.database_url.replace("+asyncpg", "").replace("postgresql+asyncpg", "postgresql"),
-    pool_pre_ping=True,
-)
-SyncSessionLocal = sessionmaker(bind=sync_engine)
+# Seconds before a backfill window that found no free stream slot runs again
+WINDOW_DEFER_COUNTDOWN = (15, 45)
 
 
-def _save_games_to_db(session, user, games_data) -> int:
-    """Helper function to save games to database. Returns count of new games."""
-    games_count = 0
-    for game in games_data:
-        game_id = game.get("id")
-        if not game_id:
-            continue
+def _after_breaker(exc: LichessUnavailableError) -> float:
+    """Countdown that re-runs a task once the Lichess breaker closes, spread over a minute."""
+    return exc.retry_after + random.uniform(0, 60)
 
-        existing = session.execute(
-            select(Game).where(
-                Game.user_id == user.id, Game.game_id == game_id
-            )
-        )
-        if existing.scalars().first():
-            continue
-
-        players = game.get("players", {})
-        white = players.get("white", {}).get("user", {}).get("name", "Unknown")
-        black = players.get("black", {}).get("user", {}).get("name", "Unknown")
-        
-        winner = game.get("winner")
-        if winner == "white":
-            result = "1-0"
-        elif winner == "black":
-            result = "0-1"
-        else:
-            result = "1/2-1/2"
-
-        opening = game.get("opening", {}).get("name", "Unknown")
-        speed = game.get("speed", "Unknown")
-        
-        played_at = None
-        if created_at := game.get("createdAt"):
-            played_at = datetime.fromtimestamp(created_at / 1000, tz=timezone.utc)
-
-        new_game = Game(
-            user_id=user.id,
-            game_id=game_id,
-            white=white,
-            black=black,
-            result=result,
-            opening=opening,
-            time_class=speed,
-            played_at=played_at,
-            pgn=game.get("pgn"),
+
+@celery_app.task(bind=True, max_retries=5)
+def sync_all_user_games(self, user_id: int):
+    """Sync ALL games for a specific user (called on first login).
+
+    Splits the history into time windows and fans them out as
+    `sync_history_window` tasks; rerunning it resumes an unfinished backfill.
+    """
+    try:
+        window_ids = run_async(sync.start_history_backfill(user_id))
+    except LichessUnavailableError as exc:
+        # Lichess is down, not this user's backfill: wait it out without using up retries
+        sync_all_user_games.apply_async((user_id,), countdown=_after_breaker(exc))
+        return {"user_id": user_id, "deferred_for": exc.retry_after}
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=min(30 * 2 ** self.request.retries, 600)) from exc
+    for window_id in window_ids:
+        sync_history_window.delay(window_id)
+    return {"user_id": user_id, "windows_enqueued": len(window_ids)}
+
+
+@celery_app.task(
+    bind=True,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    max_retries=5,
+)
+def sync_history_window(self, window_id: int):
+    """Sync one time window of a user's history backfill.
+
+    Acknowledged only when done, so a crashed worker's window is redelivered;
+    failures are retried with backoff. Both resume from the window's checkpoint.
+    While the Lichess circuit breaker is open, or no stream slot is free, the
+    window is deferred instead.
+    """
+    try:
+        result = run_async(sync.sync_history_window(window_id, self.request.id))
+    except LichessUnavailableError as exc:
+        # Re-enqueued rather than retried, so waiting out the breaker doesn't count
+        # towards the window's retries; it resumes from its checkpoint as usual.
+        sync_history_window.apply_async((window_id,), countdown=_after_breaker(exc))
+        return {"window_id": window_id, "deferred_for": exc.retry_after}
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            run_async(sync.fail_backfill_window(window_id, repr(exc)))
+            raise
+        raise self.retry(exc=exc, countdown=min(30 * 2 ** self.request.retries, 600)) from exc
+    if result.get("deferred"):
+        # All stream slots are taken: free this worker process and try again later
+        sync_history_window.apply_async(
+            (window_id,), countdown=random.uniform(*WINDOW_DEFER_COUNTDOWN)
         )
-        session.add(new_game)
-        games_count += 1
-    
-    return games_count
+    return result
 
 
 @celery_app.task
-def sync_all_user_games(user_id: int):
-    """Sync ALL games for a specific user (called on first login).
-    
-    Fetches games in batches of 50 until no more games are available.
-    Uses 'until' parameter to paginate through history.
-    """
-    import asyncio
-    from app.services.lichess import get_games
-    
-    with SyncSessionLocal() as session:
-        result = session.execute(select(User).where(User.id == user_id))
-        user = result.scalars().first()
-        
-        if not user:
-            return {"error": "User not found"}
-        
-        total_synced = 0
-        batch_size = 30
-        until_timestamp = None  # Start from most recent
-        
-        while True:
-            # Fetch batch of games
-            games_data = asyncio.run(get_games(
-                user.username, 
-                user.access_token, 
-                max_games=batch_size,
-                until=until_timestamp
-            ))
-            
-            if not games_data:
-                break  # No more games
-            
-            logger.info(f"sync_all: Fetched {len(games_data)} games for user {user.username}, until={until_timestamp}")
-            
-            # Save games to database
-            games_count = _save_games_to_db(session, user, games_data)
-            total_synced += games_count
-            
-            # Commit after each batch for reliability
-            session.commit()
-            logger.info(f"sync_all: Saved {games_count} new games (total: {total_synced})")
-            
-            # If we got less than batch_size, we've reached the end
-            if len(games_data) < batch_size:
-                break
-            
-            # Get the oldest game's timestamp for next batch
-            oldest_game = games_data[-1]
-            if created_at := oldest_game.get("createdAt"):
-                until_timestamp = created_at - 1  # -1ms to not include same game
-            else:
-                break  # Can't paginate without timestamp
-        
-        logger.info(f"sync_all: Completed for user {user.username}, total synced: {total_synced}")
-        return {"user_id": user_id, "games_synced": total_synced}
+def resume_backfills():
+    """Resume failed or stuck history backfills from their checkpoints. Run by Celery Beat."""
+    user_ids = run_async(sync.list_stalled_backfill_user_ids())
+    for user_id in user_ids:
+        sync_all_user_games.delay(user_id)
+    return {"users_enqueued": len(user_ids)}
 
 
 @celery_app.task
 def sync_recent_games():
-    """Sync recent games (last 10) for all users.
-    
-    Called periodically by Celery Beat to keep games up to date.
+    """Fan out recent-games sync for the users that are due across the workers.
+
+    Called periodically by Celery Beat. Each user has their own next-sync time
+    (see `sync.next_sync_interval`). Due users are enqueued in batches of
+    `sync_concurrency`; each batch is synced concurrently by one worker.
     """
-    import asyncio
-    from app.services.lichess import get_games
-    
-    with SyncSessionLocal() as session:
-        result = session.execute(select(User))
-        users = result.scalars().all()
-        
-        if not users:
-            return {"error": "No users found"}
-
-        total_synced = 0
-        for user in users:
-            # Fetch only last 10 games for periodic sync
-            games_data = asyncio.run(get_games(
-                user.username, user.access_token, max_games=10
-            ))
-            
-            games_count = _save_games_to_db(session, user, games_data)
-            total_synced += games_count
-
-        session.commit()
-        return {"users_synced": len(users), "games_synced": total_synced}
+    user_ids = run_async(sync.list_due_user_ids())
+    if not user_ids:
+        return {"users_enqueued": 0}
+
+    run_id = uuid.uuid4().hex
+    enqueued_at = time.time()
+    run_async(metrics.start_sync_run(run_id, enqueued_at, len(user_ids)))
+
+    batch_size = settings.sync_concurrency
+    for i in range(0, len(user_ids), batch_size):
+        sync_recent_games_batch.delay(user_ids[i:i + batch_size], run_id, enqueued_at)
+
+    return {"run_id": run_id, "users_enqueued": len(user_ids)}
+
+
+@celery_app.task
+def sync_recent_games_batch(user_ids: list[int], run_id: str, enqueued_at: float):
+    """Sync recent games for a batch of users enqueued by `sync_recent_games`."""
+    return run_async(sync.sync_recent_games_batch(user_ids, run_id, enqueued_at))
+
+
+@celery_app.task
+def import_pgn_archive(job_id: str):
+    """Import a PGN archive uploaded through `POST /api/games/import`."""
+    return run_async(imports.run_import(job_id))
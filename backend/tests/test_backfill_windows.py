@@ -0,0 +1,42 @@
+import pytest
+
+from app.services import sync
+
+
+@pytest.fixture(autouse=True)
+def window_settings(monkeypatch):
+    monkeypatch.setattr(sync.settings, "backfill_window_games", 1000)
+    monkeypatch.setattr(sync.settings, "backfill_max_windows", 8)
+
+
+def _assert_covers(windows, created_at, now):
+    """Windows are newest first, contiguous and cover [created_at, now] exactly."""
+    assert windows[0][1] == now
+    assert windows[-1][0] == created_at
+    for (since, _), (_, older_until) in zip(windows, windows[1:], strict=False):
+        assert older_until == since - 1
+    assert all(since <= until for since, until in windows)
+
+
+def test_split_history_sizes_windows_by_game_count():
+    windows = sync.split_history(0, 999_999, 3500)
+    assert len(windows) == 4
+    _assert_covers(windows, 0, 999_999)
+
+
+def test_split_history_single_window_for_small_or_unknown_history():
+    assert sync.split_history(100, 200, 10) == [(100, 200)]
+    assert sync.split_history(100, 200, None) == [(100, 200)]
+    assert sync.split_history(100, 200, 0) == [(100, 200)]
+
+
+def test_split_history_caps_window_count():
+    windows = sync.split_history(0, 10**12, 10**6)
+    assert len(windows) == 8
+    _assert_covers(windows, 0, 10**12)
+
+
+def test_split_history_never_makes_empty_windows():
+    windows = sync.split_history(500, 502, 10**6)
+    assert windows == [(502, 502), (501, 501), (500, 500)]
+    assert sync.split_history(7, 7, 10**6) == [(7, 7)]
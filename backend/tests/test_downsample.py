@@ -0,0 +1,27 @@
+from app.services.downsample import lttb
+
+
+def test_short_series_and_small_thresholds_are_returned_as_is():
+    points = [(float(x), float(x % 3)) for x in range(5)]
+    assert lttb(points, 5) == points
+    assert lttb(points, 10) == points
+    assert lttb(points, 2) == points
+    assert lttb([], 3) == []
+
+
+def test_keeps_endpoints_and_threshold_points_in_order():
+    points = [(float(x), float((x * 37) % 11)) for x in range(100)]
+    sampled = lttb(points, 10)
+    assert len(sampled) == 10
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert sampled == sorted(sampled)
+    assert set(sampled) <= set(points)
+
+
+def test_keeps_spikes():
+    points = [(float(x), 0.0) for x in range(50)]
+    points[17] = (17.0, 100.0)
+    points[33] = (33.0, -100.0)
+    sampled = lttb(points, 6)
+    assert (17.0, 100.0) in sampled
+    assert (33.0, -100.0) in sampled
@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services.crud import decode_games_cursor, encode_games_cursor
+
+
+def test_cursor_round_trip():
+    played_at = datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+    cursor = encode_games_cursor(played_at, 42)
+    assert "=" not in cursor
+    assert decode_games_cursor(cursor) == (played_at, 42)
+
+
+def test_cursor_for_undated_game():
+    assert decode_games_cursor(encode_games_cursor(None, 7)) == (None, 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "e30", "WzEsMiwzXQ", "WyJ4IiwgMV0"])
+def test_malformed_cursor_raises_value_error(cursor):
+    # "e30" is {}, "WzEsMiwzXQ" is [1,2,3], "WyJ4IiwgMV0" is ["x", 1]
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_games_cursor(cursor)
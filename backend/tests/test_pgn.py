@@ -0,0 +1,110 @@
+import io
+
+from app.services.pgn import read_games, to_lichess_game
+
+
+def _read(text: str):
+    return list(read_games(io.BytesIO(text.encode())))
+
+
+def test_read_games_splits_archive():
+    games = _read(
+        '[Event "Rated blitz game"]\n[White "a"]\n\n1. e4 e5 1-0\n\n'
+        '[Event "Casual rapid game"]\n[White "b"]\n\n1. d4 d5\n2. c4 0-1\n'
+    )
+    assert [tags["White"] for tags, _ in games] == ["a", "b"]
+    assert games[0][1] == '[Event "Rated blitz game"]\n[White "a"]\n\n1. e4 e5 1-0'
+    assert games[1][1].endswith("1. d4 d5\n2. c4 0-1")
+
+
+def test_read_games_handles_crlf_escapes_and_leading_noise():
+    games = _read('garbage before\r\n[White "A \\"Q\\" \\\\ B"]\r\n\r\n1. e4 *\r\n')
+    assert len(games) == 1
+    tags, pgn = games[0]
+    assert tags == {"White": 'A "Q" \\ B'}
+    assert pgn.endswith("1. e4 *")
+
+
+def test_read_games_keeps_wrapped_comments_in_movetext():
+    games = _read(
+        '[White "a"]\n\n1. e4 {\n[%clk 0:03:00] } e5 2. Nf3 1-0\n'
+        '[White "b"]\n\n1. d4 { a ; note\n[%eval 0.2] }\n[Nf3] 0-1\n\n[Black "c"]\n\n1. c4 *\n'
+    )
+    assert [tags for tags, _ in games] == [{"White": "a"}, {"White": "b"}, {"Black": "c"}]
+    assert games[0][1].endswith("1. e4 {\n[%clk 0:03:00] } e5 2. Nf3 1-0")
+    assert games[1][1].endswith("[%eval 0.2] }\n[Nf3] 0-1")
+
+
+def test_read_games_headers_only_and_empty():
+    assert _read("") == []
+    games = _read('[White "a"]\n[Black "b"]\n')
+    assert len(games) == 1 and games[0][0] == {"White": "a", "Black": "b"}
+
+
+def test_lichess_site_keeps_game_id():
+    game = to_lichess_game({"Site": "https://lichess.org/AbCd1234"}, "1. e4 *")
+    assert game["id"] == "AbCd1234"
+
+
+def test_other_games_get_stable_namespaced_id():
+    tags = {"Site": "Chess.com", "White": "a"}
+    first = to_lichess_game(tags, "1. e4 e5 *")
+    assert first["id"].startswith("pgn-")
+    assert first["id"] == to_lichess_game(tags, "1. e4 e5 *")["id"]
+    assert first["id"] != to_lichess_game(tags, "1. d4 *")["id"]
+    linked = to_lichess_game({"Link": "https://example.com/1"}, "1. e4 *")
+    assert linked["id"] == to_lichess_game({"Link": "https://example.com/1"}, "1. d4 *")["id"]
+
+
+def test_speed_from_event_then_time_control():
+    def speed(**tags):
+        return to_lichess_game(tags, "")["speed"]
+
+    assert speed(Event="Rated UltraBullet game") == "ultraBullet"
+    assert speed(Event="Rated Blitz game", TimeControl="60+0") == "blitz"
+    assert speed(TimeControl="15+0") == "ultraBullet"
+    assert speed(TimeControl="60+1") == "bullet"  # 60 + 40 * 1 = 100
+    assert speed(TimeControl="180+2") == "blitz"
+    assert speed(TimeControl="600+0") == "rapid"
+    assert speed(TimeControl="1800+0") == "classical"
+    assert speed(TimeControl="-") == "correspondence"
+    assert speed(TimeControl="?") == "Unknown"
+    assert speed() == "Unknown"
+
+
+def test_created_at_prefers_utc_tags():
+    game = to_lichess_game(
+        {"UTCDate": "2024.01.02", "UTCTime": "03:04:05", "Date": "1999.01.01"}, ""
+    )
+    assert game["createdAt"] == 1704164645000
+    assert to_lichess_game({"Date": "2024.01.02"}, "")["createdAt"] == 1704153600000
+    assert to_lichess_game({"Date": "2024.??.??"}, "")["createdAt"] is None
+
+
+def test_players_result_rated_and_opening():
+    game = to_lichess_game(
+        {
+            "Event": "Rated Blitz game",
+            "White": "Alice",
+            "Black": "Bob",
+            "WhiteElo": "1500",
+            "BlackElo": "?",
+            "WhiteRatingDiff": "-7",
+            "Result": "0-1",
+            "ECO": "B20",
+            "Opening": "Sicilian Defense",
+        },
+        "1. e4 c5 0-1",
+    )
+    white, black = game["players"]["white"], game["players"]["black"]
+    assert white == {"user": {"name": "Alice", "id": "alice"}, "rating": 1500, "ratingDiff": -7}
+    assert black["rating"] is None
+    assert game["winner"] == "black"
+    assert game["rated"] is True
+    assert game["opening"] == {"name": "Sicilian Defense", "eco": "B20"}
+
+    casual = to_lichess_game({"Event": "Casual game", "Result": "1/2-1/2", "ECO": "Z99"}, "")
+    assert casual["rated"] is False
+    assert "winner" not in casual
+    assert casual["opening"] == {"name": "Unknown", "eco": None}
+    assert to_lichess_game({"Event": "Titled Arena"}, "")["rated"] is None
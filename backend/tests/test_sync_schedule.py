@@ -0,0 +1,40 @@
+import pytest
+
+from app.services import sync
+
+HOUR = 60 * 60
+
+
+@pytest.fixture(autouse=True)
+def schedule_settings(monkeypatch):
+    monkeypatch.setattr(sync.settings, "sync_min_interval", 60)
+    monkeypatch.setattr(sync.settings, "sync_max_interval", 6 * HOUR)
+    monkeypatch.setattr(sync.settings, "sync_backoff_factor", 2.0)
+
+
+def test_next_sync_interval_resets_on_new_games_and_first_sync():
+    now = 1_000_000.0
+    assert sync.next_sync_interval(None, 0, None, now) == 60
+    assert sync.next_sync_interval(4 * HOUR, 3, int((now - 10 * 24 * HOUR) * 1000), now) == 60
+
+
+def test_next_sync_interval_backs_off_idle_users_up_to_max():
+    now = 10**9
+    long_ago = (now - 365 * 24 * HOUR) * 1000
+    interval, seen = 60, []
+    for _ in range(12):
+        interval = sync.next_sync_interval(interval, 0, long_ago, now)
+        seen.append(interval)
+    assert seen[:3] == [120, 240, 480]
+    assert seen[-1] == 6 * HOUR
+    assert seen == sorted(seen)
+
+
+def test_next_sync_interval_follows_recent_activity():
+    now = 10**9
+    # Played 10 minutes ago: at most a quarter of that, whatever the backoff says
+    assert sync.next_sync_interval(HOUR, 0, (now - 600) * 1000, now) == 150
+    # ...but never below the minimum
+    assert sync.next_sync_interval(HOUR, 0, (now - 60) * 1000, now) == 60
+    # Without a watermark only the backoff applies
+    assert sync.next_sync_interval(100, 0, None, now) == 200
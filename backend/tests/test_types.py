@@ -0,0 +1,35 @@
+from app.models.types import (
+    CODEC_DEFLATE,
+    CODEC_DEFLATE_PGN_V1,
+    CompressedText,
+    compress_text,
+    decompress_text,
+)
+
+PGN = (
+    '[Event "Rated Blitz game"]\n[Site "https://lichess.org/AbCd1234"]\n'
+    '[White "Alice"]\n[Black "Bob"]\n[Result "1-0"]\n\n'
+    "1. e4 { [%clk 0:03:00] } e5 { [%clk 0:03:00] } 2. Nf3 1-0"
+)
+
+
+def test_round_trip_with_each_codec():
+    for codec in (CODEC_DEFLATE, CODEC_DEFLATE_PGN_V1):
+        data = compress_text(PGN, codec)
+        assert data[0] == codec
+        assert decompress_text(data) == PGN
+    assert decompress_text(compress_text("")) == ""
+    assert decompress_text(compress_text("ü ♞")) == "ü ♞"
+
+
+def test_pgn_dictionary_compresses_better():
+    assert len(compress_text(PGN, CODEC_DEFLATE_PGN_V1)) < len(compress_text(PGN, CODEC_DEFLATE))
+
+
+def test_column_type_round_trip():
+    column = CompressedText()
+    stored = column.process_bind_param(PGN, None)
+    assert isinstance(stored, bytes) and stored[0] == CODEC_DEFLATE_PGN_V1
+    assert column.process_result_value(memoryview(stored), None) == PGN
+    assert column.process_bind_param(None, None) is None
+    assert column.process_result_value(None, None) is None
@@ -2,6 +2,8 @@ import { Game } from "../types";
 import { formatDate } from "../utils";
 import "./games-table.css";
 
+const OUTCOME_LABELS = { win: "Win", loss: "Loss", draw: "Draw" } as const;
+
 interface GamesTableProps {
   games: Game[];
   isLoading: boolean;
@@ -26,6 +28,7 @@ export default function GamesTable({ games, isLoading, username }: GamesTablePro
   }
 
   const getResultForUser = (game: Game, currentUser?: string) => {
+    if (game.outcome) return OUTCOME_LABELS[game.outcome];
     if (!currentUser) return game.result;
     
     const isWhite = game.white.toLowerCase() === currentUser.toLowerCase();
@@ -42,6 +45,7 @@ export default function GamesTable({ games, isLoading, username }: GamesTablePro
   };
 
   const getOpponent = (game: Game, currentUser?: string) => {
+    if (game.opponent) return game.opponent;
     if (!currentUser) return `${game.white} vs ${game.black}`;
     const isWhite = game.white.toLowerCase() === currentUser.toLowerCase();
     return isWhite ? game.black : game.white;
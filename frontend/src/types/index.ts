@@ -13,9 +13,17 @@ export interface Game {
   black: string;
   result: string;
   opening: string;
+  eco?: string | null;
   time_class: string;
   played_at: string | null;
-  pgn: string | null;
+  color?: "white" | "black" | null;
+  outcome?: "win" | "loss" | "draw" | null;
+  opponent?: string | null;
+  my_rating?: number | null;
+  rating_diff?: number | null;
+  opponent_rating?: number | null;
+  rated?: boolean | null;
+  pgn?: string | null;
 }
 
 export interface GamesResponse {
@@ -23,6 +31,24 @@ export interface GamesResponse {
   total: number;
   page: number;
   per_page: number;
+  next_cursor: string | null;
+}
+
+export interface OpeningStats {
+  opening: string;
+  eco: string | null;
+  color: "white" | "black";
+  games: number;
+  wins: number;
+  draws: number;
+  losses: number;
+  avg_opponent_rating: number | null;
+}
+
+export interface RatingHistory {
+  time_class: string;
+  games: number;
+  points: { played_at: string; rating: number }[];
 }
 
 export interface Profile {